@@ -56,12 +56,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "journal.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "journal.middleware.AsyncWhiteNoiseMiddleware",
+    "journal.middleware.AnonymousPageCacheMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "journal.middleware.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -110,6 +113,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# relationships, session users, tag clouds and anonymous pages are cached and
+# invalidated across requests, so every worker process has to share the cache;
+# the per-process default is only safe for the single process of runserver
+if 'RENDER' in os.environ or 'REDIS_URL' in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ['REDIS_URL'],
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -168,6 +186,35 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'journal.authentication.ModelBackend',
     'journal.authentication.EmailAuthBackend',
+    # sessions are bound to the backend that logged them in,
+    # can go once sessions from before the journal backends have expired
+    'django.contrib.auth.backends.ModelBackend',
 ]
+
+# one json line per request with its timings, see journal.middleware.ServerTimingMiddleware
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'journal.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING' if DEBUG else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# authors with more followers than this aren't fanned out to follower timelines,
+# their entries are merged into the following feed at read time instead
+TIMELINE_FANOUT_FOLLOWER_LIMIT = 1000
+
+# let staff profile requests with ?profile or an X-Profile header outside of DEBUG,
+# see journal.middleware.ProfilerMiddleware
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'
@@ -16,17 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.contrib.sitemaps.views import sitemap
 from django.contrib.auth import views as auth_views
 
 from journal import views as journal_views
 from journal import sitemaps as journal_sitemaps
 
-sitemaps = {
-    'authors': journal_sitemaps.AuthorSitemap,
-    'books': journal_sitemaps.BookSitemap,
-}
-
 urlpatterns = [
     path("admin/", admin.site.urls),
     # path('account/', journal_views.account, name='account'),
@@ -44,6 +38,7 @@ urlpatterns = [
         include([
             path('', journal_views.BookListView.as_view(), name='book_list'),
             path('create/', journal_views.BookCreateView.as_view(), name='book_create'),
+            path('autocomplete/', journal_views.BookAutocompleteView.as_view(), name='book_autocomplete'),
             path('<int:pk>/', journal_views.BookDetailView.as_view(), name='book_detail'),
         ])
     ),
@@ -52,6 +47,7 @@ urlpatterns = [
         include([
             path('', journal_views.AuthorListView.as_view(), name='author_list'),
             path('create/', journal_views.AuthorCreateView.as_view(), name='author_create'),
+            path('autocomplete/', journal_views.AuthorAutocompleteView.as_view(), name='author_autocomplete'),
             path('<int:author_pk>/', journal_views.AuthorDetailView.as_view(), name='author_detail'),
         ])
     ),
@@ -69,6 +65,7 @@ urlpatterns = [
                 'following/',
                 include([
                     path('', journal_views.FollowingList.as_view(), name='following_list'),
+                    path('feed/', journal_views.FollowingFeed.as_view(), name='following_feed'),
                     path(
                         'requests/',
                         include([
@@ -90,10 +87,10 @@ urlpatterns = [
     ),
     path('', journal_views.index, name='index'),
     path('journal/', include('journal.urls')),
+    path('sitemap.xml', journal_sitemaps.index, name='sitemap_index'),
     path(
-        'sitemap.xml',
-        sitemap,
-        {'sitemaps': sitemaps},
+        'sitemap-<section>.xml',
+        journal_sitemaps.sitemap,
         name='django.contrib.sitemaps.views.sitemap'
     ),
 ]
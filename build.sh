@@ -10,3 +10,9 @@ python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
 python manage.py migrate
+
+# Fill full-text search vectors for entries that predate the stored column
+python manage.py rebuild_search_vectors --missing
+
+# Re-render stored Markdown html written by an older renderer version
+python manage.py render_markdown
@@ -1,21 +1,75 @@
+"""
+Authentication backends.
+
+The user of a session is loaded together with its profile in one query and
+cached under a version token per user. `invalidate` replaces the token and is
+called from journal.signals whenever the user, its profile or the follow
+requests counted on the profile change, so a request spends no queries on
+identity besides loading the session. Deactivations and password changes must
+reach every worker right away, which is why deployments share the cache
+between processes (see CACHES in bookjournal.settings).
+"""
+import time
+
+from django.core.cache import cache
+from django.contrib.auth import backends
 from django.contrib.auth.models import User
 
+from journal.models import Profile
+
+CACHE_TIMEOUT = 60 * 5
+
+
+def version_key(user_id):
+    return f'auth-user:version:{user_id}'
+
+
+def invalidate(*user_ids):
+    cache.set_many({version_key(pk): time.time_ns() for pk in user_ids}, None)
+
+
+def get_cached_user(user_id):
+    """the user with `user_id` and its profile, or None"""
+    version = cache.get(version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key(user_id), version, None)
+    key = f'auth-user:{user_id}:{version}'
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('profile').filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, CACHE_TIMEOUT)
+    return user
+
 
-class EmailAuthBackend:
+async def aget_profile(user):
+    """the profile of `user` or None, without a query if it was loaded with the user"""
+    if User.profile.related.is_cached(user):
+        return getattr(user, 'profile', None)
+    return await Profile.objects.select_related('user').filter(pk=user.pk).afirst()
+
+
+class ModelBackend(backends.ModelBackend):
+    """
+    Authenticate using a username, users of sessions come from the cache.
     """
-    Authenticate using an e-mail address.
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+class EmailAuthBackend(ModelBackend):
     """
-    def authenticate(self, request, username=None, password=None):
+    Authenticate using an e-mail address, in any case.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
         try:
-            user = User.objects.get(email=username)
-            if user.check_password(password):
+            # indexed by journal_user_email_upper_idx
+            user = User.objects.get(email__iexact=username)
+            if user.check_password(password) and self.user_can_authenticate(user):
                 return user
             return None
         except (User.DoesNotExist, User.MultipleObjectsReturned):
             return None
-
-    def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
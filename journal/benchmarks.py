@@ -0,0 +1,253 @@
+"""
+View benchmarks with query and latency budgets.
+
+Every named url of the site is either in VIEWS, with the arguments to request
+it with and its budgets, or in SKIPPED. `measure` requests a url through the
+test client as one user and records its latency, the number of SQL queries
+and the time spent executing them. The bench_views command runs VIEWS against
+the local database and compares them with BASELINE; the query budgets are also
+checked by the test suite. Measurements start from an empty cache, so they
+only run with a cache local to the process, never a deployment's shared one.
+
+`asgi_get` calls the ASGI application in-process for the bench_asgi and
+profile_url commands.
+"""
+import time
+import asyncio
+import warnings
+import statistics
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import get_resolver
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.auth import get_user_model
+
+from journal import importers
+from journal.models import Book, Entry, Profile
+from journal.models.journal import Visibility
+
+SEED_PREFIX = 'bench-'
+
+BASELINE = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+
+# url name: (arguments from the fixtures, query string, max queries, max p95 ms)
+VIEWS = {
+    'index': (lambda f: {}, '', 3, 50),
+    'account': (lambda f: {}, '', 4, 50),
+    'email_update': (lambda f: {}, '', 3, 50),
+    'register': (lambda f: {}, '', 3, 50),
+    'login': (lambda f: {}, '', 4, 50),
+    'password_change': (lambda f: {}, '', 3, 50),
+    'password_change_done': (lambda f: {}, '', 3, 50),
+    'password_reset': (lambda f: {}, '', 3, 50),
+    'password_reset_done': (lambda f: {}, '', 3, 50),
+    'password_reset_complete': (lambda f: {}, '', 3, 50),
+    'book_list': (lambda f: {}, '', 7, 150),
+    'book_create': (lambda f: {}, '', 3, 50),
+    'book_autocomplete': (lambda f: {}, 'q=bench', 1, 50),
+    'book_detail': (lambda f: {'pk': f.book.pk}, '', 6, 100),
+    'author_list': (lambda f: {}, '', 6, 100),
+    'author_create': (lambda f: {}, '', 3, 50),
+    'author_autocomplete': (lambda f: {}, 'q=bench', 1, 50),
+    'author_detail': (lambda f: {'author_pk': f.author.pk}, '', 7, 100),
+    'discover': (lambda f: {}, '', 6, 300),
+    'discover_book': (lambda f: {'book_pk': f.book.pk}, '', 8, 200),
+    'following_list': (lambda f: {}, '', 6, 100),
+    'following_feed': (lambda f: {}, '', 8, 300),
+    'follow_requests': (lambda f: {}, '', 6, 50),
+    'user_detail': (lambda f: {'pk': f.other.pk}, '', 5, 50),
+    'request_follow': (lambda f: {'pk': f.other.pk}, '', 4, 50),
+    'user_journal': (lambda f: {}, '', 2, 50),
+    'journal_import': (lambda f: {}, '', 3, 50),
+    # queries grow with the size of the journal
+    'journal_export': (lambda f: {}, 'format=json', None, 1000),
+    'journal': (lambda f: {'user_pk': f.user.pk}, '', 10, 300),
+    'entry_detail': (lambda f: {'user_pk': f.user.pk, 'pk': f.entry.pk}, '', 7, 100),
+    'entry_update': (lambda f: {'user_pk': f.user.pk, 'pk': f.entry.pk}, '', 5, 100),
+    'entry_delete': (lambda f: {'user_pk': f.user.pk, 'pk': f.entry.pk}, '', 5, 50),
+    'journal_book': (lambda f: {'user_pk': f.user.pk, 'book_pk': f.book.pk}, '', 12, 200),
+    'entry_create': (lambda f: {'user_pk': f.user.pk, 'book_pk': f.book.pk}, '', 4, 100),
+    'sitemap_index': (lambda f: {}, '', 11, 100),
+    'django.contrib.sitemaps.views.sitemap': (lambda f: {'section': 'entries'}, '', 5, 1000),
+}
+
+# url names that only take POST requests or need a one-off token
+SKIPPED = {'logout', 'follow_accept', 'follow_decline', 'password_reset_confirm'}
+
+
+def url_names(resolver=None):
+    """the names of all urls outside the admin"""
+    resolver = resolver or get_resolver()
+    names = set()
+    for pattern in resolver.url_patterns:
+        if hasattr(pattern, 'url_patterns'):
+            if pattern.namespace != 'admin':
+                names |= url_names(pattern)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class Fixtures(object):
+    """the objects of `user` the urls are requested with"""
+    def __init__(self, user):
+        self.user = user
+        self.entry = Entry.objects.filter(author=user).select_related('book').first()
+        if self.entry is None:
+            raise ValueError(f'{user} has no entries')
+        self.book = self.entry.book
+        self.author = self.book.authors.first()
+        self.other = user.following.first() or get_user_model().objects.exclude(pk=user.pk).first()
+
+
+class SQLTimer(object):
+    """an execute wrapper counting the queries of the connection and the time spent in them"""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def request(client, url):
+    """GET `url`, reading streamed responses to the end, returns (status, seconds, SQLTimer)"""
+    timer = SQLTimer()
+    start = time.perf_counter()
+    with connection.execute_wrapper(timer):
+        response = client.get(url)
+        if response.streaming:
+            # exports stream an async iterator, which ASGI servers consume asynchronously
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                b''.join(response)
+    return response.status_code, time.perf_counter() - start, timer
+
+
+def has_local_cache():
+    """whether the default cache belongs to this process, only then may benchmarks empty it"""
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def clear_cache():
+    if not has_local_cache():
+        # a shared cache holds the session users, relationships and page versions of a deployment
+        raise ValueError('Refusing to empty a cache shared with other processes')
+    cache.clear()
+
+
+def measure(client, url, requests):
+    """
+    Request `url` `requests` times starting with an empty cache. Queries are
+    those of the first, uncached request, latencies are over all of them.
+    """
+    clear_cache()
+    statuses, latencies, sql_times, counts = set(), [], [], []
+    for _ in range(requests):
+        status, seconds, timer = request(client, url)
+        statuses.add(status)
+        latencies.append(seconds * 1000)
+        sql_times.append(timer.seconds * 1000)
+        counts.append(timer.count)
+    latencies.sort()
+    return {
+        'status': max(statuses),
+        'queries': counts[0],
+        'sql_ms': statistics.median(sql_times),
+        'p50': statistics.median(latencies),
+        'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+    }
+
+
+async def asgi_get(app, path, cookie=''):
+    """one GET through the ASGI application the way an ASGI server calls it, returns the status"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    done = asyncio.Event()
+    status = None
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # the client stays connected until the response is complete
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+def session_cookie(user):
+    """a cookie header value logging requests in as `user`"""
+    client = Client()
+    client.force_login(user)
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def seed(count):
+    """public journals of a few benchmark users following each other, returns the users"""
+    User = get_user_model()
+    users = []
+    for i in range(4):
+        user, _ = User.objects.get_or_create(username=f'{SEED_PREFIX}{i}')
+        Profile.objects.get_or_create(user=user, defaults={'journal_visibility': Visibility.PUBLIC})
+        users.append(user)
+    for user in users:
+        user.following.add(*[u for u in users if u != user])
+    books = max(count // 20, 1)
+    for i, user in enumerate(users):
+        importers.JournalImporter(user).run(
+            {
+                'book': f'Benchmark Book {n % books}',
+                'authors': [f'Benchmark Author {n % books % 50}'],
+                'published': None,
+                'title': f'Entry {n}',
+                'body': f'Entry *{n}* of the benchmark journal.\n\n' + 'Lorem ipsum dolor sit amet. ' * 20,
+                'tags': [f'tag-{n % 10}', 'benchmark'],
+                'section': '',
+                'chapter': '',
+                'visibility': Visibility.PUBLIC,
+                'status': None,
+                'publish_dt': None,
+            }
+            for n in range(i, count, len(users))
+        )
+    return users
+
+
+def seeded_books():
+    return Book.objects.filter(title__startswith='Benchmark Book').count()
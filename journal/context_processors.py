@@ -1,8 +1,13 @@
-from journal.models import FollowRequest
+from journal import timing
+from journal.models import Profile
 
 
 def follow_requests(request):
     context_data = dict()
-    if request.user.is_authenticated:
-        context_data['follow_request_count'] = FollowRequest.outstanding.filter(user_to=request.user).count()
+    with timing.phase('context'):
+        if request.user.is_authenticated:
+            try:
+                context_data['follow_request_count'] = request.user.profile.follow_request_count
+            except Profile.DoesNotExist:
+                context_data['follow_request_count'] = 0
     return context_data
@@ -0,0 +1,145 @@
+"""
+Streaming export of a user's journal.
+
+Entries are read through a server-side cursor in chunks, and the authors and
+tags of each chunk are loaded with one query each. Every format is produced
+as a generator of byte strings, so nothing but the current chunk is held in
+memory and the first bytes can be sent as soon as the first chunk is read.
+
+The markdown files use the front matter columns of journal.importers, so an
+export can be imported again.
+"""
+import json
+import zipfile
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.utils.text import slugify
+from django.contrib.contenttypes.models import ContentType
+
+from taggit.models import TaggedItem
+
+from journal import importers
+from journal.models import Book, Entry
+from journal.models.journal import Visibility
+
+CHUNK_SIZE = 500
+
+
+def export_rows(user):
+    """(entry, data) for each entry of `user`, data holding the columns of journal.importers"""
+    entries = Entry.objects.filter(author=user).select_related('book').order_by('publish_dt', 'pk')
+    content_type = ContentType.objects.get_for_model(Entry)
+    visibility_names = {value: str(label).lower() for value, label in Visibility.choices}
+    status_names = {value: str(label).lower() for value, label in Entry.Status.choices}
+
+    # prefetch_related builds a queryset per entry for taggit's manager, which
+    # costs more than the export itself, so related rows are grouped by hand
+    for chunk in importers.chunked(entries.iterator(chunk_size=CHUNK_SIZE), CHUNK_SIZE):
+        tags = defaultdict(list)
+        for entry_pk, name in TaggedItem.objects.filter(
+            content_type=content_type,
+            object_id__in=[entry.pk for entry in chunk],
+        ).order_by('pk').values_list('object_id', 'tag__name'):
+            tags[entry_pk].append(name)
+
+        authors = defaultdict(list)
+        for book_author in Book.authors.through.objects.filter(
+            book__in={entry.book_id for entry in chunk},
+        ).select_related('author').order_by('pk'):
+            authors[book_author.book_id].append(' '.join(str(book_author.author).split()))
+
+        for entry in chunk:
+            yield entry, {
+                'book': entry.book.title,
+                'authors': authors[entry.book_id],
+                'published': entry.book.published,
+                'title': entry.title,
+                'body': entry.body,
+                'tags': tags[entry.pk],
+                'section': entry.section,
+                'chapter': entry.chapter,
+                'visibility': visibility_names[entry.visibility],
+                'status': status_names[entry.status],
+                'publish_dt': entry.publish_dt.isoformat(),
+            }
+
+
+def export_json(user):
+    """a json array of entries"""
+    yield b'['
+    for i, (entry, data) in enumerate(export_rows(user)):
+        yield (',\n' if i else '\n').encode() + json.dumps(data).encode()
+    yield b'\n]\n'
+
+
+def entry_markdown(data):
+    data = {
+        **data,
+        'authors': f'{importers.AUTHOR_SEPARATOR} '.join(data['authors']),
+        'tags': f'{importers.TAG_SEPARATOR} '.join(data['tags']),
+        'published': '' if data['published'] is None else str(data['published']),
+    }
+    body = data.pop('body')
+    # single-line front matter values
+    front_matter = ''.join(f'{k}: {" ".join(v.split())}\n' for k, v in data.items() if v)
+    return f'---\n{front_matter}---\n{body}\n'
+
+
+def entry_filename(entry):
+    name = slugify(entry.title or entry.book.title)[:50] or 'entry'
+    return f'{entry.publish_dt:%Y-%m-%d}-{entry.pk}-{name}.md'
+
+
+class StreamBuffer(object):
+    """a write-only file whose contents are collected and emptied by `pop`"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_markdown_zip(user):
+    """a zip of one markdown file per entry, written incrementally"""
+    buffer = StreamBuffer()
+    # the buffer can't seek, so zipfile writes data descriptors after each member
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for entry, data in export_rows(user):
+            archive.writestr(f'journal/{entry_filename(entry)}', entry_markdown(data))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+async def aiter_chunks(iterator, size=64 * 1024):
+    """
+    Consume a sync iterator of bytes from async code, one thread hop per
+    `size` bytes. Under ASGI a StreamingHttpResponse over a sync iterator
+    would be read into memory as a whole before the first byte is sent.
+    """
+    def take():
+        chunk = bytearray()
+        for part in iterator:
+            chunk += part
+            if len(chunk) >= size:
+                break
+        return bytes(chunk)
+
+    while chunk := await sync_to_async(take)():
+        yield chunk
+
+
+# format: (generator, content type, file extension)
+FORMATS = {
+    'json': (export_json, 'application/json', 'json'),
+    'markdown': (export_markdown_zip, 'application/zip', 'zip'),
+}
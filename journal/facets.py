@@ -0,0 +1,221 @@
+"""
+Faceted filtering of entry lists.
+
+`Filters` narrows a list of entries to those with all of up to MAX_TAGS
+tags, on a book, published within a date range and with a visibility. Next to
+a filtered list `acount` shows how the results spread over the other tags,
+books and years, with one grouped query per facet whatever the number of
+values. Like result counts (see journal.pagination) facets never read more
+than FACET_SCAN entries: they are grouped straight from the newest FACET_SCAN
+matches, which the publish_dt indexes return in order, selected as a derived
+table so the entries are read once. Facets of lists with more matches are
+marked as capped, like capped result counts.
+
+Books and years are counted without their own filter so the alternatives to
+the chosen book or year stay listed; tags are ANDed, so the tag facet shows the
+tags that narrow the results further.
+"""
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.utils import timezone
+from django.contrib.contenttypes.models import ContentType
+from asgiref.sync import sync_to_async
+
+from journal import models
+from journal import pagination
+from journal import tagging
+from journal.models.journal import Visibility
+
+MAX_TAGS = 5
+FACET_SIZE = 20
+FACET_SCAN = pagination.COUNT_CAP
+
+# the filters a queryset can be built without
+TAGS = 'tags'
+BOOK = 'book'
+DATES = 'dates'
+VISIBILITY = 'visibility'
+FILTERS = (TAGS, BOOK, DATES, VISIBILITY)
+
+
+def start_of(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def url(query_params, **changes):
+    """a query string for `query_params` with `changes`, None removes a parameter"""
+    params = {**query_params, **changes}
+    return '?' + urlencode({k: v for k, v in params.items() if v not in (None, [])}, doseq=True)
+
+
+class Filters(object):
+    def __init__(self, tag_slugs=(), book_id=None, since=None, until=None, visibility=None):
+        self.tag_slugs = list(dict.fromkeys(tag_slugs))[:MAX_TAGS]
+        self.tags = []
+        self.book_id = book_id
+        self.book = None
+        self.since = since
+        self.until = until
+        self.visibility = visibility
+
+    def __bool__(self):
+        return bool(self.tags or self.book or self.since or self.until or self.visibility is not None)
+
+    async def aload(self):
+        """look up the tags and the book, unknown ones are ignored"""
+        tags = [await tagging.aget_tag(slug) for slug in self.tag_slugs]
+        self.tags = [tag for tag in tags if tag is not None]
+        if self.book_id is not None:
+            self.book = await models.Book.objects.filter(pk=self.book_id).afirst()
+
+    def apply(self, qs, without=()):
+        if TAGS not in without:
+            # a join per tag, entries need all of them
+            for tag in self.tags:
+                qs = qs.filter(tags=tag)
+        if BOOK not in without and self.book:
+            qs = qs.filter(book=self.book)
+        if DATES not in without:
+            if self.since:
+                qs = qs.filter(publish_dt__gte=start_of(self.since))
+            if self.until:
+                qs = qs.filter(publish_dt__lt=start_of(self.until + timedelta(days=1)))
+        if VISIBILITY not in without and self.visibility is not None:
+            qs = qs.filter(effective_visibility=self.visibility)
+        return qs
+
+    def query_params(self):
+        params = {}
+        if self.tags:
+            params['tag'] = [tag.slug for tag in self.tags]
+        if self.book:
+            params['book'] = self.book.pk
+        if self.since:
+            params['since'] = self.since.isoformat()
+        if self.until:
+            params['until'] = self.until.isoformat()
+        if self.visibility is not None:
+            params['visibility'] = self.visibility
+        return params
+
+    def active(self, query_params):
+        """a label and a link removing it for every filter in use"""
+        active = [
+            {'label': f'#{tag.name}', 'url': url(query_params, tag=[t.slug for t in self.tags if t != tag])}
+            for tag in self.tags
+        ]
+        if self.book:
+            active.append({'label': self.book.title, 'url': url(query_params, book=None)})
+        if self.since:
+            active.append({'label': f'since {self.since}', 'url': url(query_params, since=None)})
+        if self.until:
+            active.append({'label': f'until {self.until}', 'url': url(query_params, until=None)})
+        if self.visibility is not None:
+            active.append({'label': Visibility(self.visibility).label, 'url': url(query_params, visibility=None)})
+        return active
+
+
+def scanned(qs, *fields):
+    """SQL and params of `fields` of the newest FACET_SCAN entries of `qs`"""
+    return qs.order_by('-publish_dt', '-id').values(*fields)[:FACET_SCAN].query.sql_with_params()
+
+
+def fetch(qs, sql, *fields, before=(), after=()):
+    """
+    The rows of `sql` selecting from the scanned entries as `s`, as dicts.
+    `before` and `after` are the params of the placeholders around the scan.
+    """
+    scan, scan_params = scanned(qs, *fields)
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute(sql.format(scan=f'({scan}) s'), [*before, *scan_params, *after])
+        names = [column.name for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def tag_facet(qs, query_params, selected):
+    selected_slugs = [tag.slug for tag in selected]
+    rows = fetch(
+        qs,
+        """
+        SELECT t.name, t.slug, COUNT(*) AS count
+        FROM {scan}
+        JOIN taggit_taggeditem i ON i.content_type_id = %s AND i.object_id = s.id
+        JOIN taggit_tag t ON t.id = i.tag_id
+        GROUP BY t.id
+        ORDER BY count DESC, t.name
+        LIMIT %s
+        """,
+        'id',
+        after=[ContentType.objects.get_for_model(models.Entry).pk, FACET_SIZE + len(selected)],
+    )
+    return [
+        {**row, 'url': url(query_params, tag=[*selected_slugs, row['slug']])}
+        for row in rows
+        if row['slug'] not in selected_slugs
+    ][:FACET_SIZE]
+
+
+def book_facet(qs, query_params):
+    rows = fetch(
+        qs,
+        """
+        SELECT b.id AS book_id, b.title, COUNT(*) AS count
+        FROM {scan}
+        JOIN journal_book b ON b.id = s.book_id
+        GROUP BY b.id
+        ORDER BY count DESC, b.title
+        LIMIT %s
+        """,
+        'book_id',
+        after=[FACET_SIZE],
+    )
+    return [{**row, 'url': url(query_params, book=row['book_id'])} for row in rows]
+
+
+def year_facet(qs, query_params):
+    rows = fetch(
+        qs,
+        """
+        SELECT EXTRACT(YEAR FROM s.publish_dt AT TIME ZONE %s)::integer AS year, COUNT(*) AS count
+        FROM {scan}
+        GROUP BY year
+        ORDER BY year DESC
+        """,
+        'publish_dt',
+        before=[timezone.get_current_timezone_name()],
+    )
+    return [
+        {**row, 'url': url(query_params, since=f'{row["year"]}-01-01', until=f'{row["year"]}-12-31')}
+        for row in rows
+    ]
+
+
+def is_capped(qs):
+    """whether `qs` has more entries than the facets are counted from"""
+    # ordered like the scan so the publish_dt indexes serve it, exists() would drop the order
+    return bool(qs.order_by('-publish_dt', '-id').values_list('pk', flat=True)[FACET_SCAN:FACET_SCAN + 1])
+
+
+def count(get_queryset, query_params, filters, with_books=True):
+    """
+    The tag, book and year facets of a list filtered by `filters`, and which of
+    them are capped. `get_queryset(*without)` returns the list without some of
+    its filters.
+    """
+    tags_qs, books_qs, years_qs = get_queryset(), get_queryset(BOOK), get_queryset(DATES)
+    return {
+        'tags': tag_facet(tags_qs, query_params, filters.tags),
+        'books': book_facet(books_qs, query_params) if with_books else [],
+        'years': year_facet(years_qs, query_params),
+        'scan': FACET_SCAN,
+        'capped': {
+            'tags': is_capped(tags_qs),
+            'books': with_books and is_capped(books_qs),
+            'years': is_capped(years_qs),
+        },
+    }
+
+
+acount = sync_to_async(count)
@@ -0,0 +1,44 @@
+from functools import cached_property
+
+from journal import models
+from journal import pagination
+
+
+class FollowingFeedPaginator(pagination.CursorPaginator):
+    """
+    Cursor pages of the following feed of `user`.
+
+    Reads the user's fanned-out TimelineEntry rows with one index range scan
+    and merges in entries pulled from followed authors that have too many
+    followers to fan out.
+    """
+    def __init__(self, user, per_page):
+        self.timeline = models.TimelineEntry.objects.filter(user=user)
+        pull_ids = models.TimelineEntry.objects.pull_author_ids(user)
+        pulled = models.Entry.objects.visible_to_followers().filter(author__in=pull_ids)
+        super().__init__(pulled if pull_ids else pulled.none(), per_page)
+
+    @cached_property
+    def bounded_count(self):
+        n = sum(qs[:self.count_cap + 1].count() for qs in (self.timeline, self.object_list))
+        if n > self.count_cap:
+            return self.count_cap, self.CAPPED
+        return n, self.EXACT
+
+    def fetch(self, direction, values, limit):
+        keys = list(
+            self.ordered(
+                self.timeline,
+                direction,
+                values,
+                fields=('publish_dt', 'entry_id'),
+            ).values_list('publish_dt', 'entry_id')[:limit]
+        )
+        if not self.object_list.query.is_empty():
+            pulled = self.ordered(self.object_list, direction, values).values_list('publish_dt', 'id')
+            keys = sorted(
+                set(keys) | set(pulled[:limit]),
+                reverse=direction == self.NEXT,
+            )[:limit]
+        entries = models.Entry.objects.filter(pk__in=[pk for _, pk in keys]).for_list().in_bulk()
+        return [entries[pk] for _, pk in keys if pk in entries]
@@ -1,8 +1,9 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.contrib.auth import get_user_model
 from django.contrib.auth import password_validation
 
-from .models import Profile
+from .models import Book, Profile
 from .models.journal import Visibility
 
 
@@ -34,10 +35,7 @@ class UserRegistrationForm(forms.ModelForm):
         return cd['password2']
 
     def clean_email(self):
-        data = self.cleaned_data['email']
-        if get_user_model().objects.filter(email=data).exists():
-            raise forms.ValidationError('Email is already registered.')
-        return data
+        return clean_unique_email(self)
 
     def save(self, commit=True):
         user = super(UserRegistrationForm, self).save(commit=False)
@@ -48,10 +46,91 @@ class UserRegistrationForm(forms.ModelForm):
         return user
 
 
+class EmailUpdateForm(forms.ModelForm):
+    class Meta:
+        model = get_user_model()
+        fields = ['email']
+
+    def clean_email(self):
+        return clean_unique_email(self)
+
+
+def clean_unique_email(form):
+    """
+    The cleaned email of a user form, unique in any case: users log in with
+    their email matched case-insensitively (see journal.authentication).
+    """
+    data = form.cleaned_data['email']
+    others = get_user_model().objects.exclude(pk=form.instance.pk)
+    if others.filter(email__iexact=data).exists():
+        raise forms.ValidationError('Email is already registered.')
+    return data
+
+
+class AutocompleteSelectMultiple(forms.SelectMultiple):
+    """
+    A multiple select that only renders the selected options; the rest are
+    looked up from the JSON autocomplete endpoint at `url` as the user types.
+    """
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = self.url
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        pks = [v for v in value if v.isdigit()]
+        choices = self.choices
+        self.choices = [(obj.pk, str(obj)) for obj in choices.queryset.filter(pk__in=pks)] if pks else []
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
+class BookForm(forms.ModelForm):
+    class Meta:
+        model = Book
+        fields = ('title', 'authors', 'published',)
+        widgets = {
+            'authors': AutocompleteSelectMultiple(url=reverse_lazy('author_autocomplete')),
+        }
+
+
 class SearchForm(forms.Form):
     query = forms.CharField()
 
 
+class FacetForm(forms.Form):
+    """the filters of journal.facets besides tags, which are repeated ?tag= parameters"""
+    book = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    since = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    until = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    visibility = forms.TypedChoiceField(
+        choices=[('', 'Any visibility'), *Visibility.choices],
+        coerce=int,
+        empty_value=None,
+        required=False,
+    )
+
+
+class JournalImportForm(forms.Form):
+    file = forms.FileField(
+        help_text='A csv with book, authors, title, body, tags and publish_dt columns, '
+                  'a Goodreads library export, or a markdown file with front matter.',
+    )
+    format = forms.ChoiceField(
+        choices=[('', 'Guess from file name'), ('csv', 'CSV'), ('markdown', 'Markdown')],
+        required=False,
+    )
+
+
 class DiscoverViewSelectForm(forms.Form):
     view_select = forms.ChoiceField(
         choices=Visibility,
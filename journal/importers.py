@@ -0,0 +1,381 @@
+"""
+Bulk import of journal entries from exported files.
+
+Readers turn a text stream into row dicts one line at a time, so files of any
+size are never held in memory. `JournalImporter` writes the rows in batches:
+authors, books and tags are resolved with a few queries per batch and
+deduplicated against the database and earlier batches, entries and taggings
+are written with bulk_create, and the derived data Entry.save would otherwise
+maintain (rendered html, effective visibility, search vectors, entry counts,
+follower timelines, cached sitemaps and pages) is refreshed per batch.
+"""
+import csv
+import itertools
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.contrib.contenttypes.models import ContentType
+
+from taggit.models import Tag, TaggedItem
+
+from journal import pagecache
+from journal import sitemaps
+from journal import tagging
+from journal.models import Author, Book, Entry, Profile, TagUsage, TimelineEntry
+from journal.models.journal import Visibility
+
+# columns of the csv format, also the keys of the markdown front matter
+COLUMNS = (
+    'book',
+    'authors',
+    'published',
+    'title',
+    'body',
+    'tags',
+    'section',
+    'chapter',
+    'visibility',
+    'status',
+    'publish_dt',
+)
+AUTHOR_SEPARATOR = ';'
+TAG_SEPARATOR = ','
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def split(value, separator):
+    return [part.strip() for part in (value or '').split(separator) if part.strip()]
+
+
+def name_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def parse_publish_dt(value):
+    value = (value or '').strip().replace('/', '-')
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        date = parse_date(value)
+        if date is None:
+            raise ImportFormatError(f'invalid date "{value}"')
+        dt = datetime.combine(date, time())
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def parse_choice(value, choices):
+    """a choice value given as either its value or its label"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    for choice in choices:
+        if value.casefold() in (str(choice.value), choice.label.casefold()):
+            return choice.value
+    raise ImportFormatError(f'invalid value "{value}"')
+
+
+def parse_year(value):
+    value = (value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def clean_row(data):
+    """a row dict from the string values of the csv columns"""
+    return {
+        'book': (data.get('book') or '').strip(),
+        'authors': split(data.get('authors'), AUTHOR_SEPARATOR),
+        'published': parse_year(data.get('published')),
+        'title': (data.get('title') or '').strip(),
+        'body': (data.get('body') or '').strip(),
+        'tags': split(data.get('tags'), TAG_SEPARATOR),
+        'section': (data.get('section') or '').strip(),
+        'chapter': (data.get('chapter') or '').strip(),
+        'visibility': parse_choice(data.get('visibility'), Visibility),
+        'status': parse_choice(data.get('status'), Entry.Status),
+        'publish_dt': parse_publish_dt(data.get('publish_dt')),
+    }
+
+
+def goodreads_row(data):
+    """map a row of a Goodreads library export onto the csv columns; only reviews become entries"""
+    return {
+        'book': data.get('Title'),
+        'authors': AUTHOR_SEPARATOR.join([
+            data.get('Author') or '',
+            *split(data.get('Additional Authors'), ','),
+        ]),
+        'published': data.get('Original Publication Year') or data.get('Year Published'),
+        'body': (data.get('My Review') or '').replace('<br/>', '\n'),
+        'tags': data.get('Bookshelves'),
+        'publish_dt': data.get('Date Read') or data.get('Date Added'),
+    }
+
+
+def read_csv(lines):
+    """rows of a csv in our own format or a Goodreads library export"""
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    goodreads = 'My Review' in reader.fieldnames
+    if not goodreads and not {'book', 'body'}.issubset(reader.fieldnames):
+        raise ImportFormatError('the csv needs at least "book" and "body" columns')
+    for data in reader:
+        try:
+            yield clean_row(goodreads_row(data) if goodreads else data)
+        except ImportFormatError as e:
+            raise ImportFormatError(f'line {reader.line_num}: {e}') from e
+
+
+def read_markdown(lines):
+    """
+    Rows of a markdown file of entries, each introduced by a front matter block:
+
+        ---
+        book: The Hobbit
+        authors: J. R. R. Tolkien
+        tags: fantasy, reread
+        ---
+        The body of the entry.
+    """
+    header, body = None, None
+    in_header = False
+    lines = iter(lines)
+    line_num = 0
+    for line in lines:
+        line_num += 1
+        stripped = line.rstrip('\r\n')
+        if in_header:
+            if stripped.strip() == '---':
+                in_header = False
+                body = []
+                continue
+            key, sep, value = stripped.partition(':')
+            if not sep or key.strip() not in COLUMNS:
+                raise ImportFormatError(f'line {line_num}: expected "key: value" front matter')
+            header[key.strip()] = value.strip()
+            continue
+        if stripped.strip() == '---':
+            # a horizontal rule in a body, unless front matter follows
+            following = next(lines, None)
+            line_num += 1
+            if following is not None and following.partition(':')[0].strip() in COLUMNS:
+                if header is not None:
+                    yield finish_markdown_row(header, body, line_num)
+                key, _, value = following.partition(':')
+                header, body = {key.strip(): value.strip()}, None
+                in_header = True
+                continue
+            if body is not None:
+                body.append(stripped)
+                if following is not None:
+                    body.append(following.rstrip('\r\n'))
+            continue
+        if body is not None:
+            body.append(stripped)
+    if in_header:
+        raise ImportFormatError(f'line {line_num}: unterminated front matter')
+    if header is not None:
+        yield finish_markdown_row(header, body, line_num)
+
+
+def finish_markdown_row(header, body, line_num):
+    try:
+        return clean_row({**header, 'body': '\n'.join(body or [])})
+    except ImportFormatError as e:
+        raise ImportFormatError(f'entry ending on line {line_num}: {e}') from e
+
+
+READERS = {
+    'csv': read_csv,
+    'markdown': read_markdown,
+}
+
+
+def guess_format(filename):
+    return 'markdown' if filename.lower().endswith(('.md', '.markdown')) else 'csv'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class JournalImporter(object):
+    """imports rows as entries of `user`, see the module docstring"""
+    batch_size = 1000
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or self.batch_size
+        self.profile = Profile.objects.filter(user=user).first()
+        self.content_type = ContentType.objects.get_for_model(Entry)
+        # resolved rows, reused across batches
+        self.authors = {}
+        self.books = {}
+        self.tags = {}
+        self.created = 0
+        self.skipped = 0
+
+    def run(self, rows, start=0, progress=None):
+        """
+        Import `rows` after skipping the first `start`, calling `progress` with
+        the number of rows done after each committed batch. Returns that number.
+        """
+        done = start
+        for batch in chunked(itertools.islice(rows, start, None), self.batch_size):
+            self.import_batch(batch)
+            done += len(batch)
+            if progress:
+                progress(done)
+        return done
+
+    @transaction.atomic
+    def import_batch(self, rows):
+        valid = [row for row in rows if row['book'] and row['body']]
+        self.skipped += len(rows) - len(valid)
+        if not valid:
+            return []
+
+        self.resolve_authors({name for row in valid for name in row['authors']})
+        self.resolve_books(valid)
+        entries = Entry.objects.bulk_create([self.build_entry(row) for row in valid])
+        self.resolve_tags({tag for row in valid for tag in row['tags']})
+        TaggedItem.objects.bulk_create(
+            [
+                TaggedItem(content_type=self.content_type, object_id=entry.pk, tag_id=self.tags[tag])
+                for entry, row in zip(entries, valid)
+                for tag in set(row['tags'])
+            ],
+            ignore_conflicts=True,
+        )
+
+        Entry.objects.filter(pk__in=[entry.pk for entry in entries]).update_search_vector()
+        Profile.objects.filter(pk=self.user.pk).update(entry_count=F('entry_count') + len(entries))
+        TimelineEntry.objects.fan_out_created(self.user.pk, entries)
+        TagUsage.objects.refresh(self.user.pk, {entry.book_id for entry in entries})
+        tagging.invalidate(self.user.pk)
+        sitemaps.invalidate()
+        pagecache.purge('entries', 'books', 'authors', pagecache.user_tag(self.user.pk))
+        self.created += len(entries)
+        return entries
+
+    def resolve_authors(self, names):
+        missing = {name_key(name): name for name in names if name_key(name) not in self.authors}
+        if not missing:
+            return
+        candidates = Author.objects.filter(
+            last_name__in={name.split()[-1] for name in missing.values()},
+        ) | Author.objects.filter(aka__in=missing.values())
+        for author in candidates.order_by('pk'):
+            for key in (name_key(author.full_name), name_key(author.aka)):
+                if key in missing:
+                    self.authors.setdefault(key, author.pk)
+
+        new = {key: self.build_author(name) for key, name in missing.items() if key not in self.authors}
+        Author.objects.bulk_create(new.values())
+        self.authors.update((key, author.pk) for key, author in new.items())
+
+    def build_author(self, name):
+        parts = name.split()
+        return Author(
+            first_name=parts[0][:50] if len(parts) > 1 else '',
+            middle_name=' '.join(parts[1:-1])[:50],
+            last_name=parts[-1][:50],
+        )
+
+    def book_key(self, title, author_keys):
+        """a book is identified by its title and its first author"""
+        return title.casefold(), author_keys[0] if author_keys else ''
+
+    def resolve_books(self, rows):
+        missing = {}
+        for row in rows:
+            row['book'] = row['book'][:Book._meta.get_field('title').max_length]
+            key = self.book_key(row['book'], [name_key(name) for name in row['authors']])
+            if key not in self.books:
+                missing.setdefault(key, row)
+        if not missing:
+            return
+
+        existing = dict(
+            Book.objects.filter(
+                title__in={row['book'] for row in missing.values()},
+            ).order_by('pk').values_list('pk', 'title')
+        )
+        author_keys = {}
+        for key, pk in self.authors.items():
+            author_keys.setdefault(pk, []).append(key)
+        book_authors = {pk: [] for pk in existing}
+        for book_pk, author_pk in Book.authors.through.objects.filter(
+            book__in=existing,
+        ).order_by('pk').values_list('book_id', 'author_id'):
+            book_authors[book_pk].append(author_pk)
+        for pk, title in existing.items():
+            keys = [key for a in book_authors[pk] for key in author_keys.get(a, [])] or ['']
+            for author_key in keys:
+                key = (title.casefold(), author_key)
+                if key in missing:
+                    self.books.setdefault(key, pk)
+
+        new_rows = [(key, row) for key, row in missing.items() if key not in self.books]
+        books = Book.objects.bulk_create([
+            Book(title=row['book'], published=row['published']) for _, row in new_rows
+        ])
+        Book.authors.through.objects.bulk_create(
+            [
+                Book.authors.through(book_id=book.pk, author_id=author_pk)
+                for book, (_, row) in zip(books, new_rows)
+                for author_pk in dict.fromkeys(self.authors[name_key(name)] for name in row['authors'])
+            ],
+            ignore_conflicts=True,
+        )
+        for book, (key, _) in zip(books, new_rows):
+            self.books[key] = book.pk
+
+    def resolve_tags(self, names):
+        names = {name[:100] for name in names} - self.tags.keys()
+        if not names:
+            return
+        self.tags.update(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+        missing = names - self.tags.keys()
+        if not missing:
+            return
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=Tag().slugify(name)) for name in missing],
+            ignore_conflicts=True,
+        )
+        self.tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+        for name in missing - self.tags.keys():
+            # the slug is taken by a differently spelled tag, let taggit find a free one
+            self.tags[name] = Tag.objects.create(name=name).pk
+
+    def build_entry(self, row):
+        row['tags'] = [tag[:100] for tag in row['tags']]
+        default_visibility = self.profile.default_visibility if self.profile else Visibility.PRIVATE
+        journal_visibility = self.profile.journal_visibility if self.profile else Visibility.PRIVATE
+        visibility = row['visibility'] if row['visibility'] is not None else default_visibility
+        entry = Entry(
+            author=self.user,
+            book_id=self.books[self.book_key(row['book'], [name_key(name) for name in row['authors']])],
+            title=row['title'][:200],
+            body=row['body'],
+            section=row['section'][:200],
+            chapter=row['chapter'][:200],
+            visibility=visibility,
+            effective_visibility=min(visibility, journal_visibility),
+            status=row['status'] or Entry.Status.PUBLISHED,
+        )
+        if row['publish_dt']:
+            entry.publish_dt = row['publish_dt']
+        entry.render_markdown_fields()
+        return entry
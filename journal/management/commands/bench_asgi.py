@@ -0,0 +1,101 @@
+import json
+import time
+import asyncio
+import statistics
+
+from django.urls import reverse
+from django.core.asgi import get_asgi_application
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import benchmarks
+from journal.models import Entry
+from journal.models.journal import Visibility
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure throughput and latency of the read views under concurrent load by '
+        'calling the ASGI application in-process against the local database. '
+        'Save a run with --save and compare a later run (e.g. after switching branches) with --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Paths to request, defaults to the main read views.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per path and concurrency level.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--user', help='Username to request the pages as, anonymous by default.')
+        parser.add_argument('--seed', type=int, default=0, help='Create this many entries for benchmark users first.')
+        parser.add_argument('--save', help='Write the results to this json file.')
+        parser.add_argument('--compare', help='Json file of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            benchmarks.seed(options['seed'])
+            self.stdout.write(f'Seeded {options["seed"]} entries on {benchmarks.seeded_books()} books')
+        cookie = ''
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user named "{options["user"]}"')
+            cookie = benchmarks.session_cookie(user)
+
+        paths = options['paths'] or self.default_paths()
+        results = asyncio.run(self.run(paths, options['requests'], options['concurrency'], cookie))
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        for key, result in results.items():
+            line = f'{key:60} {result["rps"]:8.1f} req/s  p50 {result["p50"]:6.1f}ms  p95 {result["p95"]:6.1f}ms'
+            if key in baseline:
+                line += f'  ({result["rps"] / baseline[key]["rps"] - 1:+.0%} req/s)'
+            self.stdout.write(line)
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def default_paths(self):
+        entry = Entry.objects.filter(
+            status=Entry.Status.PUBLISHED,
+            effective_visibility=Visibility.PUBLIC,
+        ).order_by('-pk').first()
+        if entry is None:
+            raise CommandError('No public entries to request, run with --seed first')
+        return [
+            reverse('discover'),
+            reverse('discover_book', args=[entry.book_id]),
+            reverse('journal', args=[entry.author_id]),
+            reverse('entry_detail', args=[entry.author_id, entry.pk]),
+            reverse('book_detail', args=[entry.book_id]),
+            reverse('user_detail', args=[entry.author_id]),
+        ]
+
+    async def run(self, paths, requests, concurrency_levels, cookie):
+        app = get_asgi_application()
+        results = {}
+        for path in paths:
+            status = await benchmarks.asgi_get(app, path, cookie)
+            if status != 200:
+                raise CommandError(f'{path} returned {status}')
+            for concurrency in concurrency_levels:
+                latencies = []
+                remaining = iter(range(requests))
+
+                async def worker():
+                    for _ in remaining:
+                        start = time.perf_counter()
+                        await benchmarks.asgi_get(app, path, cookie)
+                        latencies.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - start
+                latencies.sort()
+                results[f'{path} c={concurrency}'] = {
+                    'rps': requests / elapsed,
+                    'p50': statistics.median(latencies),
+                    'p95': latencies[int(len(latencies) * 0.95) - 1],
+                }
+        return results
@@ -0,0 +1,83 @@
+import json
+
+from django.test import Client
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every view as one user against the local database and record its p50/p95 latency, '
+        'query count and SQL time. Fails when a view exceeds its budget in journal.benchmarks, '
+        'issues more queries than in the baseline or has a slower median than the baseline by more than the tolerance.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Url names to benchmark, defaults to all of them.')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per view.')
+        parser.add_argument('--user', default=f'{benchmarks.SEED_PREFIX}1', help='Username to request the views as.')
+        parser.add_argument('--seed', type=int, default=0, help='Create this many entries for benchmark users first.')
+        parser.add_argument('--baseline', default=str(benchmarks.BASELINE), help='Json file of the baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p50 slowdown against the baseline.')
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+
+    def handle(self, *args, **options):
+        if not benchmarks.has_local_cache():
+            raise CommandError('Views are measured with an empty cache, run with a local cache instead of REDIS_URL')
+        if options['seed']:
+            benchmarks.seed(options['seed'])
+            self.stdout.write(f'Seeded {options["seed"]} entries on {benchmarks.seeded_books()} books')
+        user = get_user_model().objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'No user named "{options["user"]}", run with --seed first')
+        unknown = set(options['names']) - benchmarks.VIEWS.keys()
+        if unknown:
+            raise CommandError(f'No benchmark for {", ".join(sorted(unknown))}')
+        fixtures = benchmarks.Fixtures(user)
+        # the host bench_asgi requests too
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        baseline = {}
+        if not options['save']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except FileNotFoundError:
+                pass
+
+        results, failures = {}, []
+        for name in options['names'] or benchmarks.VIEWS:
+            kwargs, query_string, max_queries, max_p95 = benchmarks.VIEWS[name]
+            url = reverse(name, kwargs=kwargs(fixtures))
+            if query_string:
+                url += f'?{query_string}'
+            result = results[name] = benchmarks.measure(client, url, options['requests'])
+            self.stdout.write(
+                f'{name:40} {result["p50"]:7.1f}ms p50 {result["p95"]:7.1f}ms p95 '
+                f'{result["queries"]:4} queries {result["sql_ms"]:7.1f}ms sql'
+            )
+
+            if result['status'] >= 400:
+                failures.append(f'{name} returned {result["status"]}')
+            if max_queries is not None and result['queries'] > max_queries:
+                failures.append(f'{name} made {result["queries"]} queries, the budget is {max_queries}')
+            if max_p95 is not None and result['p95'] > max_p95:
+                failures.append(f'{name} took {result["p95"]:.1f}ms at p95, the budget is {max_p95}ms')
+            if name in baseline:
+                if result['queries'] > baseline[name]['queries']:
+                    failures.append(f'{name} made {result["queries"]} queries, {baseline[name]["queries"]} in the baseline')
+                # the median, since the tail of a few requests is mostly noise
+                if result['p50'] > baseline[name]['p50'] * (1 + options['tolerance']):
+                    failures.append(f'{name} took {result["p50"]:.1f}ms at p50, {baseline[name]["p50"]:.1f}ms in the baseline')
+
+        if options['save']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(results, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f'Saved the baseline to {options["baseline"]}')
+        if failures:
+            raise CommandError('Over budget:\n' + '\n'.join(failures))
@@ -0,0 +1,37 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import exporters
+
+
+class Command(BaseCommand):
+    help = 'Export every journal entry of a user as json or as a zip of markdown files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format',
+            choices=sorted(exporters.FORMATS),
+            default='json',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write, defaults to stdout.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user named "{options["username"]}"')
+
+        export = exporters.FORMATS[options['format']][0]
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                f.writelines(export(user))
+        else:
+            out = sys.stdout.buffer
+            out.writelines(export(user))
+            out.flush()
@@ -0,0 +1,72 @@
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import importers
+
+
+class Command(BaseCommand):
+    help = (
+        'Import journal entries for a user from a csv (our own columns or a Goodreads '
+        'library export) or a markdown file with front matter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=sorted(importers.READERS),
+            help='Input format, guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importers.JournalImporter.batch_size,
+            help='Number of rows written per transaction.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the rows done after each batch, defaults to PATH.checkpoint.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Skip the rows recorded in the checkpoint by an interrupted import.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user named "{options["username"]}"')
+
+        path = options['path']
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        start = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start = json.load(f)['rows']
+            self.stdout.write(f'Resuming after row {start}')
+
+        def progress(done):
+            with open(checkpoint, 'w') as f:
+                json.dump({'path': path, 'rows': done}, f)
+            self.stdout.write(f'{done} rows done')
+
+        read = importers.READERS[options['format'] or importers.guess_format(path)]
+        importer = importers.JournalImporter(user, options['batch_size'])
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                done = importer.run(read(f), start=start, progress=progress)
+        except importers.ImportFormatError as e:
+            raise CommandError(f'{path}: {e}, rerun with --resume after fixing it')
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.created} entries from {done - start} rows, '
+            f'skipped {importer.skipped} rows without a book or body'
+        ))
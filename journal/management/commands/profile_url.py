@@ -0,0 +1,57 @@
+import sys
+import asyncio
+
+from django.core.asgi import get_asgi_application
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import benchmarks
+from journal import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile requests of a url through the ASGI application against the local database. '
+        'Prints the time by ORM, template and markdown and writes the collapsed stacks, '
+        'which flamegraph.pl and speedscope read.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', help='Username to request the url as, anonymous by default.')
+        parser.add_argument('--output', help='File to write the collapsed stacks to, defaults to stdout.')
+        parser.add_argument('--requests', type=int, default=1, help='Requests to profile, their samples are added up.')
+        parser.add_argument('--interval', type=float, default=0.001, help='Seconds between samples.')
+        parser.add_argument('--cold', action='store_true', help='Profile with an empty cache and no warm-up request.')
+
+    def handle(self, *args, **options):
+        if options['cold'] and not benchmarks.has_local_cache():
+            raise CommandError('--cold empties the cache, run with a local cache instead of REDIS_URL')
+        cookie = ''
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user named "{options["user"]}"')
+            cookie = benchmarks.session_cookie(user)
+        app = get_asgi_application()
+        path = options['path']
+
+        if options['cold']:
+            benchmarks.clear_cache()
+        else:
+            asyncio.run(benchmarks.asgi_get(app, path, cookie))
+        # the event loop runs in this thread, sync code in threads of its own
+        with profiling.Sampler(sys._getframe(), threads=None, interval=options['interval']) as sampler:
+            for _ in range(options['requests']):
+                status = asyncio.run(benchmarks.asgi_get(app, path, cookie))
+        if status >= 400:
+            raise CommandError(f'{path} returned {status}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(sampler.collapsed())
+        else:
+            self.stdout.write(sampler.collapsed(), ending='')
+        self.stderr.write(f'{path}: {sum(sampler.samples.values())} samples over {sampler.seconds * 1000:.0f}ms')
+        for name, share in sampler.breakdown().items():
+            self.stderr.write(f'{name:10} {share:6.1%}')
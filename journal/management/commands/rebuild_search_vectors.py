@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from journal.models import Entry
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored full-text search vector of journal entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of entries updated per statement.',
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only fill entries that have no search vector yet.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        qs = Entry.objects.order_by('pk')
+        if options['missing']:
+            qs = qs.filter(search_vector__isnull=True)
+
+        updated = 0
+        last_pk = 0
+        while True:
+            pks = list(qs.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            updated += Entry.objects.filter(pk__in=pks).update_search_vector()
+            last_pk = pks[-1]
+            self.stdout.write(f'{updated} entries updated')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search vectors for {updated} entries'))
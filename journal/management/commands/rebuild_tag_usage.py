@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from journal import tagging
+from journal.models import Entry, TagUsage
+
+
+class Command(BaseCommand):
+    help = 'Recount the tags of the entries of every journal for its tag cloud.'
+
+    def handle(self, *args, **options):
+        user_ids = Entry.objects.order_by('author_id').values_list('author_id', flat=True).distinct()
+        # users without entries left
+        TagUsage.objects.exclude(user_id__in=user_ids).delete()
+        rebuilt = 0
+        for user_id in user_ids:
+            TagUsage.objects.refresh(user_id)
+            rebuilt += 1
+        tagging.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the tag usage of {rebuilt} journals'))
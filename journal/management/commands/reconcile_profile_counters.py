@@ -0,0 +1,25 @@
+from django.db.models import F, Q
+from django.core.management.base import BaseCommand
+
+from journal import authentication
+from journal.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Recount the denormalized follow request, follower, following and entry counters of profiles.'
+
+    def handle(self, *args, **options):
+        expressions = Profile.objects.counter_expressions()
+        drifted = Q()
+        for field in expressions:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+        pks = list(
+            Profile.objects.annotate(
+                **{f'actual_{f}': e for f, e in expressions.items()},
+            ).filter(drifted).values_list('pk', flat=True)
+        )
+        for pk in pks:
+            self.stdout.write(f'Counters of profile {pk} drifted')
+        Profile.objects.filter(pk__in=pks).refresh_counters()
+        authentication.invalidate(*pks)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters of {len(pks)} profiles'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from journal.models import Entry, Profile
+from journal.rendering import MARKDOWN_RENDERER_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Re-render the stored html of entry bodies and profile descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows rendered and written per batch.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render every row, not only rows rendered by an older renderer version.',
+        )
+
+    def handle(self, *args, **options):
+        for model in (Entry, Profile):
+            count = self.render_model(model, options['batch_size'], options['all'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Rendered {count} {model._meta.verbose_name_plural}')
+            )
+
+    def render_model(self, model, batch_size, render_all):
+        qs = model.objects.order_by('pk').only(
+            'pk',
+            'markdown_version',
+            *model.markdown_fields,
+        )
+        if not render_all:
+            qs = qs.exclude(markdown_version=MARKDOWN_RENDERER_VERSION)
+
+        update_fields = model.rendered_columns()
+        count = 0
+        batch = []
+        for obj in qs.iterator(chunk_size=batch_size):
+            obj.render_markdown_fields(force=True)
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, update_fields)
+                count += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, update_fields)
+            count += len(batch)
+        return count
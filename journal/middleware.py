@@ -0,0 +1,205 @@
+import sys
+import json
+import time
+import logging
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from journal import pagecache
+from journal import profiling
+from journal import timing
+
+request_logger = logging.getLogger('journal.requests')
+
+
+class ServerTimingMiddleware(object):
+    """
+    Time the database, template rendering, markdown and context processor
+    phases of each request with journal.timing. Reports them in a
+    Server-Timing header and as one json log line per request on the
+    `journal.requests` logger. Goes first so the total covers all other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # a coroutine, so the async handler doesn't call it through a thread
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.report(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.report(request, response, timings)
+
+    def process_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    def time_rendering(self, response):
+        # template responses are rendered by the handler after the view returns
+        timings = timing.current()
+        started = time.perf_counter()
+
+        def rendered(response):
+            timings.add('render', time.perf_counter() - started)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, timings):
+        response['Server-Timing'] = timings.header()
+        if request_logger.isEnabledFor(logging.INFO):
+            match = request.resolver_match
+            request_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'queries': timings.queries,
+                **{f'{phase}_ms': round(ms, 1) for phase, ms in timings.ms().items()},
+            }))
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise is sync only, so under ASGI Django would hop to a thread and
+    back for every request passing through it. Only static files need its
+    sync code; every other request is handed on without leaving the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class AnonymousPageCacheMiddleware(object):
+    """
+    Answer anonymous GETs from journal.pagecache and store the responses of
+    views using PageCacheMixin. Goes before the session middleware, so a hit
+    touches neither the session nor the database.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not pagecache.is_cacheable(request):
+            return self.get_response(request)
+        started = time.time_ns()
+        response = pagecache.get(request)
+        if response is None:
+            response = self.get_response(request)
+            pagecache.store(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        if not pagecache.is_cacheable(request):
+            return await self.get_response(request)
+        started = time.time_ns()
+        # one thread hop for the few cache reads rather than one each
+        response = await sync_to_async(pagecache.get)(request)
+        if response is None:
+            response = await self.get_response(request)
+            await sync_to_async(pagecache.store)(request, response, started)
+        return response
+
+
+class ProfilerMiddleware(object):
+    """
+    Run a request of a staff user under journal.profiling.Sampler when it
+    has a `profile` query parameter or an X-Profile header, and answer with
+    the profile instead of the page: the time by ORM, template and markdown
+    and the collapsed stacks, or only the stacks for `profile=collapsed`.
+    Only with DEBUG or PROFILER_ENABLED on, so a link can't profile production.
+    Goes after the authentication middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def profile_format(self, request):
+        if not (settings.DEBUG or settings.PROFILER_ENABLED):
+            return None
+        return request.GET.get('profile', request.headers.get('X-Profile'))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile_format = self.profile_format(request)
+        if profile_format is None or not request.user.is_staff:
+            return self.get_response(request)
+        with profiling.Sampler(sys._getframe()) as sampler:
+            response = self.get_response(request)
+        return self.profile_response(request, response, sampler, profile_format)
+
+    async def __acall__(self, request):
+        profile_format = self.profile_format(request)
+        if profile_format is None or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+        # the thread running the sync code of this request
+        sync_thread = await sync_to_async(threading.get_ident)()
+        with profiling.Sampler(sys._getframe(), threads=[sync_thread]) as sampler:
+            response = await self.get_response(request)
+        return self.profile_response(request, response, sampler, profile_format)
+
+    def profile_response(self, request, response, sampler, profile_format):
+        if profile_format == 'collapsed':
+            content = sampler.collapsed()
+        else:
+            content = sampler.report(f'{request.method} {request.get_full_path()} {response.status_code}')
+        return HttpResponse(content, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0002_entry_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='markdown_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='about_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='markdown_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
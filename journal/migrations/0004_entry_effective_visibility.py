@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Least
+
+
+def fill_effective_visibility(apps, schema_editor):
+    Entry = apps.get_model('journal', 'Entry')
+    Profile = apps.get_model('journal', 'Profile')
+    journal_visibility = Subquery(
+        Profile.objects.filter(user_id=OuterRef('author_id')).values('journal_visibility')[:1]
+    )
+    Entry.objects.filter(author__profile__isnull=False).update(
+        effective_visibility=Least('visibility', journal_visibility),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0003_stored_markdown_html'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='effective_visibility',
+            field=models.IntegerField(choices=[(0, 'Private'), (1, 'Followers'), (2, 'Public')], default=0, editable=False),
+        ),
+        migrations.RunPython(fill_effective_visibility, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['effective_visibility', 'status', '-publish_dt', '-id'], name='entry_visibility_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    Entry = apps.get_model('journal', 'Entry')
+    Follower = apps.get_model('journal', 'Follower')
+    TimelineEntry = apps.get_model('journal', 'TimelineEntry')
+    for user_id, author_id in Follower.objects.values_list('user_from_id', 'user_to_id').iterator():
+        entries = Entry.objects.filter(
+            author_id=author_id,
+            status='p',
+            effective_visibility__gte=1,
+        ).values_list('pk', 'publish_dt')
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, entry_id=pk, author_id=author_id, publish_dt=publish_dt)
+                for pk, publish_dt in entries
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0004_entry_effective_visibility'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('publish_dt', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journal.entry')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-publish_dt', '-entry_id'),
+                'indexes': [models.Index(fields=['user', '-publish_dt', '-entry'], name='timeline_user_feed_idx'), models.Index(fields=['author', 'user'], name='timeline_author_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'entry'), name='timeline_unique_user_entry')],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
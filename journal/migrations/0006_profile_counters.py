@@ -0,0 +1,56 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:36
+
+from django.db import migrations, models
+from django.db.models import Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Entry = apps.get_model('journal', 'Entry')
+    Profile = apps.get_model('journal', 'Profile')
+    Follower = apps.get_model('journal', 'Follower')
+    FollowRequest = apps.get_model('journal', 'FollowRequest')
+
+    def count(qs):
+        return Coalesce(
+            Subquery(qs.order_by().annotate(n=Func('pk', function='COUNT')).values('n')),
+            0,
+        )
+
+    Profile.objects.update(
+        follow_request_count=count(FollowRequest.objects.filter(user_to=OuterRef('pk'), status='o')),
+        follower_count=count(Follower.objects.filter(user_to=OuterRef('pk'))),
+        following_count=count(Follower.objects.filter(user_from=OuterRef('pk'))),
+        entry_count=count(Entry.objects.filter(author=OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0005_timeline_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='entry_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follow_request_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='outstanding follow requests'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0006_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('first_name', 'middle_name', 'last_name', 'aka', config='simple'), name='author_name_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('title', config='simple'), name='book_title_search_idx'),
+        ),
+    ]
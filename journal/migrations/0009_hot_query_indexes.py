@@ -0,0 +1,93 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0008_library_updated'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # the new indexes exist before the foreign key indexes they cover are dropped
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name'], name='author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['author', '-publish_dt', '-id'], name='entry_author_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['book', '-publish_dt', '-id'], name='entry_book_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(
+                condition=models.Q(('status', 'p')),
+                fields=['-publish_dt', '-id'],
+                name='entry_published_feed_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['user_to', 'status', '-requested'], name='request_to_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['user_from', 'user_to', '-requested'], name='request_pair_idx'),
+        ),
+        # auth.User can't declare indexes of its own, EmailAuthBackend looks users up by email
+        migrations.RunSQL(
+            sql='CREATE INDEX journal_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX journal_user_email_idx',
+        ),
+        # keep the first row of any duplicated follow
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM journal_follower a
+                USING journal_follower b
+                WHERE a.id > b.id AND a.user_from_id = b.user_from_id AND a.user_to_id = b.user_to_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='follower',
+            constraint=models.UniqueConstraint(fields=('user_from', 'user_to'), name='follower_unique_pair'),
+        ),
+        migrations.AlterField(
+            model_name='entry',
+            name='author',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='entry',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='journal.book'),
+        ),
+        migrations.AlterField(
+            model_name='follower',
+            name='user_from',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower_from_set', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='followrequest',
+            name='user_from',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='request_from_set', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='followrequest',
+            name='user_to',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='request_to_set', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_tag_usage(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    content_type = ContentType.objects.filter(app_label='journal', model='entry').first()
+    if content_type is None:
+        return
+    # drafts count as private, see TagUsageQuerySet.refresh
+    schema_editor.execute(
+        """
+        INSERT INTO journal_tagusage (user_id, book_id, tag_id, visibility, count)
+        SELECT e.author_id, e.book_id, t.tag_id, CASE WHEN e.status = 'p' THEN e.visibility ELSE 0 END, COUNT(*)
+        FROM journal_entry e
+        JOIN taggit_taggeditem t ON t.content_type_id = %s AND t.object_id = e.id
+        GROUP BY 1, 2, 3, 4
+        """,
+        [content_type.pk],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0009_hot_query_indexes'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visibility', models.IntegerField(choices=[(0, 'Private'), (1, 'Followers'), (2, 'Public')])),
+                ('count', models.PositiveIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journal.book')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='taggit.tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'book', 'tag', 'visibility'), name='tag_usage_unique')],
+            },
+        ),
+        migrations.RunPython(fill_tag_usage, migrations.RunPython.noop),
+    ]
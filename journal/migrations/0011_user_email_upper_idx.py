@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0010_tag_usage'),
+    ]
+
+    operations = [
+        # EmailAuthBackend matches emails case-insensitively, with UPPER() = UPPER()
+        migrations.RunSQL(
+            sql='DROP INDEX journal_user_email_idx',
+            reverse_sql='CREATE INDEX journal_user_email_idx ON auth_user (email)',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX journal_user_email_upper_idx ON auth_user (UPPER(email))',
+            reverse_sql='DROP INDEX journal_user_email_upper_idx',
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+from django.utils.text import Truncator
+
+# journal.rendering.PREVIEW_WORDS when the previews were added
+PREVIEW_WORDS = 60
+
+
+def render_preview(html):
+    preview = Truncator(html).words(PREVIEW_WORDS, html=True, truncate=' …')
+    return preview, preview != html
+
+
+def fill_previews(apps, schema_editor):
+    # previews of entries rendered by an older renderer are cut from their stale
+    # html, their markdown_version still marks them for `manage.py render_markdown`
+    Entry = apps.get_model('journal', 'Entry')
+    entries = Entry.objects.exclude(body_html='').only('pk', 'body_html')
+    batch = []
+    for entry in entries.order_by('pk').iterator(chunk_size=500):
+        entry.preview_html, entry.preview_truncated = render_preview(entry.body_html)
+        batch.append(entry)
+        if len(batch) >= 500:
+            Entry.objects.bulk_update(batch, ['preview_html', 'preview_truncated'])
+            batch = []
+    Entry.objects.bulk_update(batch, ['preview_html', 'preview_truncated'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_user_email_upper_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='preview_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='preview_truncated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
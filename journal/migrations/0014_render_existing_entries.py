@@ -0,0 +1,61 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:32
+
+import markdown
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.contrib.postgres.search import SearchVector
+from django.utils.text import Truncator
+
+# journal.rendering as of this migration, frozen so later renderer changes can't alter it
+MARKDOWN_RENDERER_VERSION = 1
+PREVIEW_WORDS = 60
+
+
+def render_preview(html):
+    preview = Truncator(html).words(PREVIEW_WORDS, html=True, truncate=' …')
+    return preview, preview != html
+
+
+def render_entries(apps, schema_editor):
+    # entries from before 0003 have no stored html and so no preview, list pages
+    # would show them blank until `manage.py render_markdown` ran
+    Entry = apps.get_model('journal', 'Entry')
+    md = markdown.Markdown(extensions=[])
+    fields = ['body_html', 'markdown_version', 'preview_html', 'preview_truncated']
+    entries = Entry.objects.exclude(markdown_version=MARKDOWN_RENDERER_VERSION).only('pk', 'body')
+    batch = []
+    for entry in entries.order_by('pk').iterator(chunk_size=500):
+        entry.body_html = md.reset().convert(entry.body)
+        entry.markdown_version = MARKDOWN_RENDERER_VERSION
+        entry.preview_html, entry.preview_truncated = render_preview(entry.body_html)
+        batch.append(entry)
+        if len(batch) >= 500:
+            Entry.objects.bulk_update(batch, fields)
+            batch = []
+    Entry.objects.bulk_update(batch, fields)
+
+
+def fill_search_vectors(apps, schema_editor):
+    # like EntryQuerySet.update_search_vector, for entries from before 0002
+    Entry = apps.get_model('journal', 'Entry')
+    Book = apps.get_model('journal', 'Book')
+    book_title = Subquery(Book.objects.filter(pk=OuterRef('book_id')).values('title')[:1])
+    Entry.objects.filter(search_vector__isnull=True).update(
+        search_vector=(
+            SearchVector('title', weight='A')
+            + SearchVector(book_title, weight='B')
+            + SearchVector('body', weight='C')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0013_entry_author_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(render_entries, migrations.RunPython.noop),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
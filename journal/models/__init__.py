@@ -7,4 +7,6 @@ from .journal import (
     Profile,
     Follower,
     FollowRequest,
+    TimelineEntry,
+    TagUsage,
 )
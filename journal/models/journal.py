@@ -1,12 +1,20 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connections, models, transaction
 from django.urls import reverse
+from django.db.models import Count, F, Func, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Least
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
+from taggit.models import Tag
 from taggit.managers import TaggableManager
 
+from journal import rendering
 from . import library
 
 
@@ -16,19 +24,121 @@ class Visibility(models.IntegerChoices):
     PUBLIC = 2, _('Public')
 
 
-class Entry(models.Model):
+class RenderedMarkdownMixin(object):
+    """keeps the rendered html of each of `markdown_fields` in a `<field>_html` column"""
+    markdown_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_markdown = {f: instance.__dict__.get(f) for f in cls.markdown_fields}
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        fields = [
+            f for f in self.markdown_fields
+            if update_fields is None or f in update_fields
+        ]
+        if fields:
+            rendered = self.render_markdown_fields(fields)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *rendered}
+        super().save(*args, **kwargs)
+
+    def render_markdown_fields(self, fields=None, force=False):
+        """render markdown sources that changed since load, returns the names of the updated columns"""
+        fields = self.markdown_fields if fields is None else fields
+        loaded = getattr(self, '_loaded_markdown', {})
+        current = self.markdown_version == rendering.MARKDOWN_RENDERER_VERSION
+        updated = []
+        for field in fields:
+            source = getattr(self, field)
+            if force or not current or loaded.get(field) != source:
+                setattr(self, f'{field}_html', rendering.render_markdown(source))
+                updated.append(f'{field}_html')
+            loaded[field] = source
+        self._loaded_markdown = loaded
+        if set(fields) == set(self.markdown_fields) and not current:
+            self.markdown_version = rendering.MARKDOWN_RENDERER_VERSION
+            updated.append('markdown_version')
+        return updated
+
+    @classmethod
+    def rendered_columns(cls):
+        """the columns `render_markdown_fields` writes"""
+        return [f'{f}_html' for f in cls.markdown_fields] + ['markdown_version']
+
+    def get_markdown_html(self, field):
+        if self.markdown_version == rendering.MARKDOWN_RENDERER_VERSION:
+            return getattr(self, f'{field}_html')
+        # stored html predates the current renderer and hasn't been re-rendered yet
+        return rendering.render_markdown(getattr(self, field))
+
+
+class EntryQuerySet(models.QuerySet):
+    def visible_to_followers(self):
+        return self.filter(
+            status=Entry.Status.PUBLISHED,
+            effective_visibility__gte=Visibility.FOLLOWERS,
+        )
+
+    def public(self):
+        return self.filter(
+            status=Entry.Status.PUBLISHED,
+            effective_visibility=Visibility.PUBLIC,
+        )
+
+    def for_list(self):
+        """
+        batch-load everything the entry list templates render for each entry,
+        which show previews and leave out the bodies
+        """
+        return self.select_related(
+            'author',
+            'book',
+        ).prefetch_related(
+            'book__authors',
+            'tags',
+        ).defer(
+            'body',
+            'body_html',
+            'search_vector',
+        )
+
+    def update_search_vector(self):
+        """recompute the stored search vector of every entry in the queryset with a single UPDATE"""
+        book_title = Subquery(
+            library.Book.objects.filter(pk=OuterRef('book_id')).values('title')[:1]
+        )
+        return self.update(
+            search_vector=(
+                SearchVector('title', weight='A')
+                + SearchVector(book_title, weight='B')
+                + SearchVector('body', weight='C')
+            ),
+        )
+
+
+class Entry(RenderedMarkdownMixin, models.Model):
+    SEARCH_FIELDS = {'title', 'body', 'book'}
+    markdown_fields = ('body',)
+
     class Status(models.TextChoices):
         DRAFT = 'd', _('Draft')
         PUBLISHED = 'p', _('Published')
 
+    # indexed by entry_author_feed_idx and entry_book_feed_idx
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         editable=False,
+        db_index=False,
     )
     book = models.ForeignKey(
         library.Book,
         on_delete=models.CASCADE,  # doesn't feel right, consider changing
+        db_index=False,
     )
     title = models.CharField(
         max_length=200,
@@ -38,6 +148,19 @@ class Entry(models.Model):
     body = models.TextField(
         blank=False,
     )
+    body_html = models.TextField(
+        blank=True,
+        editable=False,
+    )
+    # the start of body_html for list pages, which don't load the body
+    preview_html = models.TextField(
+        blank=True,
+        editable=False,
+    )
+    preview_truncated = models.BooleanField(
+        default=False,
+        editable=False,
+    )
     status = models.CharField(
         max_length=1,
         choices=Status,
@@ -66,20 +189,157 @@ class Entry(models.Model):
     updated = models.DateTimeField(
         auto_now=True,
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+    markdown_version = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+    )
+    # min(visibility, author's journal_visibility), kept in sync by Entry.save and Profile.save
+    effective_visibility = models.IntegerField(
+        choices=Visibility,
+        default=Visibility.PRIVATE,
+        editable=False,
+    )
+
+    objects = EntryQuerySet.as_manager()
 
     class Meta:
         ordering = ('-publish_dt',)
         verbose_name = 'entry'
         verbose_name_plural = 'entries'
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(
+                fields=['effective_visibility', 'status', '-publish_dt', '-id'],
+                name='entry_visibility_feed_idx',
+            ),
+            # journals, with or without the status and visibility filters of other readers
+            models.Index(
+                fields=['author', '-publish_dt', '-id'],
+                name='entry_author_feed_idx',
+            ),
+            models.Index(
+                fields=['book', '-publish_dt', '-id'],
+                name='entry_book_feed_idx',
+            ),
+            # the latest change of a journal, see journal.views.Journal.aget_validators
+            models.Index(
+                fields=['author', '-updated'],
+                name='entry_author_updated_idx',
+            ),
+            # discover for signed in readers, whose visibility filter is a disjunction
+            models.Index(
+                fields=['-publish_dt', '-id'],
+                condition=models.Q(status='p'),
+                name='entry_published_feed_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.publish_dt} - {self.title if self.title else self.book} - {self.author}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_feed_state = instance.feed_state()
+        instance._loaded_tag_usage_state = instance.tag_usage_state()
+        return instance
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'visibility' in update_fields:
+            self.effective_visibility = self.get_effective_visibility()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'effective_visibility'}
+        super().save(*args, **kwargs)
+        if adding:
+            Profile.objects.filter(pk=self.author_id).update(entry_count=F('entry_count') + 1)
+        if update_fields is None or self.SEARCH_FIELDS.intersection(update_fields):
+            Entry.objects.filter(pk=self.pk).update_search_vector()
+        if self.feed_state() != getattr(self, '_loaded_feed_state', None):
+            TimelineEntry.objects.fan_out(self)
+            self._loaded_feed_state = self.feed_state()
+        loaded = getattr(self, '_loaded_tag_usage_state', None)
+        if self.tag_usage_state() != loaded:
+            # new entries get their tags after they are saved, see journal.signals
+            if not adding:
+                TagUsage.objects.refresh(self.author_id, {self.book_id, *(loaded[:1] if loaded else ())})
+            self._loaded_tag_usage_state = self.tag_usage_state()
+
+    def feed_state(self):
+        """the fields that decide where the entry appears in follower feeds"""
+        return tuple(self.__dict__.get(f) for f in ('status', 'effective_visibility', 'publish_dt'))
+
+    def render_markdown_fields(self, fields=None, force=False):
+        updated = super().render_markdown_fields(fields, force)
+        if 'body_html' in updated:
+            self.preview_html, self.preview_truncated = rendering.render_preview(self.body_html)
+            updated += ['preview_html', 'preview_truncated']
+        return updated
+
+    @classmethod
+    def rendered_columns(cls):
+        return super().rendered_columns() + ['preview_html', 'preview_truncated']
+
+    def get_preview_html(self):
+        # unlike get_markdown_html there is no fallback to rendering the body, which
+        # lists don't load; stale previews are current again after `manage.py render_markdown`
+        return self.preview_html
+
+    def tag_usage_state(self):
+        """the fields that decide which TagUsage rows count the entry's tags"""
+        return tuple(self.__dict__.get(f) for f in ('book_id', 'status', 'visibility'))
+
+    def visible_to_followers(self):
+        return (
+            self.status == Entry.Status.PUBLISHED
+            and self.effective_visibility >= Visibility.FOLLOWERS
+        )
+
+    def get_effective_visibility(self):
+        try:
+            journal_visibility = self.author.profile.journal_visibility
+        except Profile.DoesNotExist:
+            # Profile.save recomputes the author's entries once the profile exists
+            journal_visibility = Visibility.PRIVATE
+        return min(self.visibility, journal_visibility)
+
     def get_absolute_url(self):
-        return reverse('entry_detail', args=[self.author.username, self.pk])
+        return reverse('entry_detail', args=[self.author_id, self.pk])
+
+
+class ProfileQuerySet(models.QuerySet):
+    def counter_expressions(self):
+        """subqueries recounting each denormalized counter from its source table"""
+        def count(qs):
+            return Coalesce(
+                Subquery(qs.order_by().annotate(n=Func('pk', function='COUNT')).values('n')),
+                0,
+            )
+
+        return {
+            'follow_request_count': count(FollowRequest.outstanding.filter(user_to=OuterRef('pk'))),
+            'follower_count': count(Follower.objects.filter(user_to=OuterRef('pk'))),
+            'following_count': count(Follower.objects.filter(user_from=OuterRef('pk'))),
+            'entry_count': count(Entry.objects.filter(author=OuterRef('pk'))),
+        }
+
+    def refresh_counters(self, *fields):
+        """recount `fields` (default all counters) of every profile in the queryset in one UPDATE"""
+        expressions = self.counter_expressions()
+        return self.update(**{f: expressions[f] for f in fields or expressions})
 
 
-class Profile(models.Model):
+class Profile(RenderedMarkdownMixin, models.Model):
+    markdown_fields = ('about',)
+    # only ever written with queryset updates so concurrent changes aren't lost
+    COUNTER_FIELDS = ('follow_request_count', 'follower_count', 'following_count', 'entry_count')
+
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -99,13 +359,62 @@ class Profile(models.Model):
     about = models.TextField(
         blank=True,
     )
+    about_html = models.TextField(
+        blank=True,
+        editable=False,
+    )
+    markdown_version = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+    )
+    follow_request_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='outstanding follow requests',
+    )
+    follower_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    entry_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+
+    objects = ProfileQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_journal_visibility = instance.__dict__.get('journal_visibility')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if getattr(self, '_loaded_journal_visibility', None) != self.journal_visibility:
+            Entry.objects.filter(author_id=self.user_id).update(
+                effective_visibility=Least('visibility', Value(self.journal_visibility)),
+            )
+            TimelineEntry.objects.refan_author(self.user_id)
+        self._loaded_journal_visibility = self.journal_visibility
 
 
 class Follower(models.Model):
+    # indexed by follower_unique_pair
     user_from = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name='follower_from_set',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     user_to = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -118,6 +427,12 @@ class Follower(models.Model):
 
     class Meta:
         ordering = ('user_to__username',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_from', 'user_to'],
+                name='follower_unique_pair',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user_from.username} follows {self.user_to.username}'
@@ -155,15 +470,18 @@ class DeclinedManager(models.Manager):
 
 
 class FollowRequest(models.Model):
+    # indexed by request_pair_idx and request_to_status_idx
     user_from = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name='request_from_set',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     user_to = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name='request_to_set',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     message = models.CharField(
         max_length=200,
@@ -188,14 +506,40 @@ class FollowRequest(models.Model):
 
     class Meta:
         ordering = ('-requested',)
+        indexes = [
+            # the outstanding, accepted and declined requests of a user
+            models.Index(
+                fields=['user_to', 'status', '-requested'],
+                name='request_to_status_idx',
+            ),
+            # the latest request between two users
+            models.Index(
+                fields=['user_from', 'user_to', '-requested'],
+                name='request_pair_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user_from.username} requested to follow {self.user_to.username}'
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Profile.objects.filter(pk=self.user_to_id).refresh_counters('follow_request_count')
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Profile.objects.filter(pk=self.user_to_id).refresh_counters('follow_request_count')
+        return result
+
+    @transaction.atomic
     def accept(self):
         self.status = RequestStatus.ACCEPTED
         self.save()
         self.user_from.following.add(self.user_to)
+        TimelineEntry.objects.backfill(self.user_from_id, self.user_to_id)
+        TimelineEntry.objects.backfill(self.user_to_id, self.user_from_id)
 
     def decline(self):
         self.status = RequestStatus.DECLINED
@@ -211,3 +555,242 @@ User.add_to_class(
         symmetrical=False,
     )
 )
+
+
+class TimelineEntryManager(models.Manager):
+    """
+    Fan-out-on-write maintenance of the following feed.
+
+    Published entries visible to followers are copied into a TimelineEntry row
+    for every follower of their author. Authors with more than
+    TIMELINE_FANOUT_FOLLOWER_LIMIT followers are not fanned out, their entries
+    are pulled when the feed is read.
+    """
+    batch_size = 1000
+
+    def is_pull_author(self, author_id):
+        return Profile.objects.filter(
+            pk=author_id,
+            follower_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT,
+        ).exists()
+
+    def pull_author_ids(self, user):
+        """followed authors whose entries are read at request time instead of fanned out"""
+        return list(
+            Profile.objects.filter(
+                pk__in=Follower.objects.filter(user_from=user).values('user_to'),
+                follower_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT,
+            ).values_list('pk', flat=True)
+        )
+
+    def fan_out(self, entry):
+        """add `entry` to, or remove it from, the feeds of its author's followers"""
+        if not entry.visible_to_followers() or self.is_pull_author(entry.author_id):
+            self.filter(entry=entry).delete()
+            return
+
+        followers = Follower.objects.filter(
+            user_to_id=entry.author_id,
+        ).values_list('user_from_id', flat=True)
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=follower_id,
+                    entry_id=entry.pk,
+                    author_id=entry.author_id,
+                    publish_dt=entry.publish_dt,
+                )
+                for follower_id in followers.iterator(chunk_size=self.batch_size)
+            ),
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'entry'],
+            update_fields=['publish_dt'],
+        )
+
+    def fan_out_created(self, author_id, entries):
+        """add newly created entries of one author to their followers' feeds, e.g. after a bulk import"""
+        entries = [entry for entry in entries if entry.visible_to_followers()]
+        if not entries or self.is_pull_author(author_id):
+            return
+        followers = list(
+            Follower.objects.filter(user_to_id=author_id).values_list('user_from_id', flat=True)
+        )
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=follower_id,
+                    entry_id=entry.pk,
+                    author_id=author_id,
+                    publish_dt=entry.publish_dt,
+                )
+                for follower_id in followers
+                for entry in entries
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def backfill(self, user_id, author_id):
+        """copy the followers-visible entries of the author into the feed of the user"""
+        if self.is_pull_author(author_id):
+            return
+        entries = Entry.objects.visible_to_followers().filter(
+            author_id=author_id,
+        ).values_list('pk', 'publish_dt')
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    entry_id=pk,
+                    author_id=author_id,
+                    publish_dt=publish_dt,
+                )
+                for pk, publish_dt in entries.iterator(chunk_size=self.batch_size)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def remove(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def refan_author(self, author_id):
+        """rebuild every feed row of the author, e.g. after their journal visibility changed"""
+        self.filter(author_id=author_id).delete()
+        if self.is_pull_author(author_id):
+            return
+        entries = Entry.objects.visible_to_followers().filter(
+            author_id=author_id,
+        ).order_by().values('pk', 'publish_dt').query.sql_with_params()
+        followers = Follower.objects.filter(
+            user_to_id=author_id,
+        ).order_by().values('user_from_id').query.sql_with_params()
+        # every entry for every follower in one INSERT ... SELECT
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.model._meta.db_table} (user_id, entry_id, author_id, publish_dt)
+                SELECT f.user_from_id, e.id, %s, e.publish_dt
+                FROM ({entries[0]}) e CROSS JOIN ({followers[0]}) f
+                ON CONFLICT DO NOTHING
+                """,
+                [author_id, *entries[1], *followers[1]],
+            )
+
+
+class TimelineEntry(models.Model):
+    """an entry fanned out to the following feed of one of its author's followers"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+    entry = models.ForeignKey(
+        Entry,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    # copied from the entry so the feed and unfollow removal never join Entry
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    publish_dt = models.DateTimeField()
+
+    objects = TimelineEntryManager()
+
+    class Meta:
+        ordering = ('-publish_dt', '-entry_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'entry'],
+                name='timeline_unique_user_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-publish_dt', '-entry'],
+                name='timeline_user_feed_idx',
+            ),
+            models.Index(
+                fields=['author', 'user'],
+                name='timeline_author_user_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.entry_id} in the feed of {self.user_id}'
+
+
+class TagUsageQuerySet(models.QuerySet):
+    def refresh(self, user_id, book_ids=None):
+        """recount the rows of the user's entries on `book_ids`, default all books, from their tags"""
+        entries = Entry.objects.filter(author_id=user_id, tags__isnull=False)
+        usage = self.filter(user_id=user_id)
+        if book_ids is not None:
+            entries = entries.filter(book_id__in=book_ids)
+            usage = usage.filter(book_id__in=book_ids)
+        counts = Counter()
+        for book_id, tag_id, status, visibility, count in entries.order_by().values_list(
+            'book_id', 'tags', 'status', 'visibility',
+        ).annotate(count=Count('pk')):
+            # drafts are only shown to their author, like private entries
+            if status != Entry.Status.PUBLISHED:
+                visibility = Visibility.PRIVATE
+            counts[book_id, tag_id, visibility] += count
+        with transaction.atomic():
+            usage.delete()
+            self.bulk_create(
+                TagUsage(user_id=user_id, book_id=book_id, tag_id=tag_id, visibility=visibility, count=count)
+                for (book_id, tag_id, visibility), count in counts.items()
+            )
+
+    def cloud(self, user_id, visibility, book_id=None):
+        """name, slug and count of the tags of the user's entries a reader allowed `visibility` sees"""
+        qs = self.filter(user_id=user_id, visibility__gte=visibility)
+        if book_id is not None:
+            qs = qs.filter(book_id=book_id)
+        return qs.values('tag__name', 'tag__slug').annotate(count=Sum('count')).order_by('-count', 'tag__name')
+
+
+class TagUsage(models.Model):
+    """
+    How many of a user's entries on a book have a tag, by the entry's own
+    visibility, drafts counting as private. A reader allowed to see `visibility`
+    sees the rows at or above it: the journal visibility needs no column since
+    the journal of a user is only shown to readers it admits.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='tag_usage',
+        on_delete=models.CASCADE,
+    )
+    book = models.ForeignKey(
+        library.Book,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    tag = models.ForeignKey(
+        Tag,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    visibility = models.IntegerField(
+        choices=Visibility,
+    )
+    count = models.PositiveIntegerField()
+
+    objects = TagUsageQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book', 'tag', 'visibility'],
+                name='tag_usage_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.tag_id} on {self.count} entries of {self.user_id} on {self.book_id}'
@@ -1,5 +1,52 @@
+import re
+
 from django.db import models
 from django.urls import reverse
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchVector
+
+# unstemmed, so partially typed words still prefix-match
+SEARCH_CONFIG = 'simple'
+
+AUTHOR_NAME_VECTOR = SearchVector('first_name', 'middle_name', 'last_name', 'aka', config=SEARCH_CONFIG)
+BOOK_TITLE_VECTOR = SearchVector('title', config=SEARCH_CONFIG)
+
+
+def prefix_query(text):
+    """a tsquery matching every word of `text` as a word prefix, or None"""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return SearchQuery(
+        ' & '.join(f'{word}:*' for word in words),
+        config=SEARCH_CONFIG,
+        search_type='raw',
+    )
+
+
+class AuthorQuerySet(models.QuerySet):
+    def search(self, text):
+        """authors whose names prefix-match every word of `text`, served by author_name_search_idx"""
+        query = prefix_query(text)
+        if query is None:
+            return self.none()
+        return self.alias(name_search=AUTHOR_NAME_VECTOR).filter(name_search=query)
+
+
+class BookQuerySet(models.QuerySet):
+    def search(self, text):
+        """books whose title or an author's name prefix-match every word of `text`"""
+        query = prefix_query(text)
+        if query is None:
+            return self.none()
+        # a union rather than an OR so each side can use its own index
+        by_title = Book.objects.alias(
+            title_search=BOOK_TITLE_VECTOR,
+        ).filter(title_search=query).order_by()
+        by_author = Book.authors.through.objects.filter(
+            author__in=Author.objects.search(text).values('pk'),
+        )
+        return self.filter(pk__in=by_title.values('pk').union(by_author.values('book')))
 
 
 class Author(models.Model):
@@ -20,12 +67,21 @@ class Author(models.Model):
         max_length=200,
         verbose_name='commonly known as',
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+    )
+
+    objects = AuthorQuerySet.as_manager()
 
     class Meta:
         ordering = (
             'last_name',
             'first_name',
         )
+        indexes = [
+            GinIndex(AUTHOR_NAME_VECTOR, name='author_name_search_idx'),
+            models.Index(fields=['last_name', 'first_name'], name='author_name_idx'),
+        ]
 
     def __str__(self):
         if self.aka:
@@ -57,14 +113,41 @@ class Book(models.Model):
     description = models.TextField(
         blank=True,
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+    )
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         ordering = (
             'title',
         )
+        indexes = [
+            GinIndex(BOOK_TITLE_VECTOR, name='book_title_search_idx'),
+            models.Index(fields=['title'], name='book_title_idx'),
+        ]
 
     def __str__(self):
         return str(self.title)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored title so save() knows when entry search vectors are stale,
+        # a deferred title is only known to change once it is assigned
+        if 'title' in field_names:
+            instance._loaded_title = instance.title
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if 'title' not in self.__dict__:
+            return
+        if not adding and self.title != getattr(self, '_loaded_title', None):
+            self.entry_set.update_search_vector()
+        self._loaded_title = self.title
+
     def get_absolute_url(self):
         return reverse('book_detail', args=[self.pk])
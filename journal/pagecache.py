@@ -0,0 +1,105 @@
+"""
+Whole-page cache for anonymous visitors.
+
+Requests without a session or messages cookie are answered from the cache by
+journal.middleware.AnonymousPageCacheMiddleware before they reach the session,
+auth or any view. Views opt in with PageCacheMixin, which tags each response
+with the books, authors and users it shows, surrogate-key style.
+
+Every tag has a version token in the cache and a cached page stores the tokens
+of its tags, so `purge` (called from journal.signals and the bulk importer)
+drops all pages of a tag by replacing its token. Tokens are nanosecond
+timestamps: a page is only stored if none of its tags was purged while it was
+being rendered. Purges have to reach every worker, so deployments share the
+cache between processes (see CACHES in bookjournal.settings).
+"""
+import time
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_http_date_safe
+from django.utils.cache import get_conditional_response
+from django.contrib.messages.storage.cookie import CookieStorage
+
+TIMEOUT = 60 * 5
+
+
+def book_tag(pk):
+    return f'book:{pk}'
+
+
+def author_tag(pk):
+    return f'author:{pk}'
+
+
+def user_tag(pk):
+    return f'user:{pk}'
+
+
+def entry_tags(entries):
+    """the tags of entries rendered with their author, book and the book's authors"""
+    tags = set()
+    for entry in entries:
+        tags.update((user_tag(entry.author_id), book_tag(entry.book_id)))
+        tags.update(author_tag(author.pk) for author in entry.book.authors.all())
+    return tags
+
+
+def version_key(tag):
+    return f'page-tag:{tag}'
+
+
+def purge(*tags):
+    cache.set_many({version_key(tag): time.time_ns() for tag in tags}, None)
+
+
+def is_cacheable(request):
+    """only anonymous GETs without anything in their session or messages"""
+    return (
+        request.method == 'GET'
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def page_key(request):
+    return 'page:' + hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def get(request):
+    """the cached response for `request` if none of its tags was purged since"""
+    cached = cache.get(page_key(request))
+    if cached is None:
+        return None
+    versions, response = cached
+    if cache.get_many([version_key(tag) for tag in versions]) != {
+        version_key(tag): version for tag, version in versions.items()
+    }:
+        return None
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response,
+    )
+
+
+def store(request, response, started):
+    """cache a response tagged by PageCacheMixin, `started` being time.time_ns() before the view ran"""
+    tags = getattr(response, 'page_cache_tags', None)
+    if (
+        tags is None
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        # the page has a csrf token
+        or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        return
+    keys = {version_key(tag): tag for tag in tags}
+    for key in keys.keys() - cache.get_many(keys).keys():
+        cache.add(key, started, None)
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    if len(versions) == len(keys) and all(version <= started for version in versions.values()):
+        cache.set(page_key(request), (versions, response), TIMEOUT)
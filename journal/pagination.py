@@ -0,0 +1,247 @@
+import json
+import base64
+import binascii
+from functools import cached_property
+
+from django.db import connections
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+
+COUNT_CAP = 1000
+
+
+def estimate_count(qs):
+    """the planner's row estimate for `qs`, no rows are read"""
+    sql, params = qs.order_by().query.sql_with_params()
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class BoundedCountMixin(object):
+    """
+    Counts that never scan more than `count_cap` rows.
+
+    Filtered lists are counted up to the cap and reported as "1000+" beyond
+    it. Unfiltered lists (`estimate=True`) use the planner's estimate when it
+    is above the cap.
+    """
+    count_cap = COUNT_CAP
+    estimate = False
+    EXACT = 'exact'
+    CAPPED = 'capped'
+    ESTIMATED = 'estimated'
+
+    @cached_property
+    def bounded_count(self):
+        """(count, kind) where kind is one of EXACT, CAPPED or ESTIMATED"""
+        if self.estimate:
+            estimate = estimate_count(self.object_list)
+            if estimate > self.count_cap:
+                return estimate, self.ESTIMATED
+        n = self.object_list[:self.count_cap + 1].count()
+        if n > self.count_cap:
+            return self.count_cap, self.CAPPED
+        return n, self.EXACT
+
+    @property
+    def count(self):
+        return self.bounded_count[0]
+
+    @property
+    def count_is_exact(self):
+        return self.bounded_count[1] == self.EXACT
+
+    def format_bounded(self, n):
+        kind = self.bounded_count[1]
+        if kind == self.CAPPED:
+            return f'{n}+'
+        if kind == self.ESTIMATED:
+            return f'~{n}'
+        return str(n)
+
+    @property
+    def count_display(self):
+        return self.format_bounded(self.count)
+
+
+class BoundedCountPaginator(BoundedCountMixin, Paginator):
+    """page number pagination on top of bounded counts"""
+    def __init__(self, *args, count_cap=COUNT_CAP, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cap = count_cap
+        self.estimate = estimate
+
+    @property
+    def num_pages_display(self):
+        return self.format_bounded(self.num_pages)
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        # the count is a lower bound or a guess, so look one row ahead instead
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return BoundedPage(rows[:self.per_page], number, self, more=len(rows) > self.per_page)
+
+
+class BoundedPage(Page):
+    def __init__(self, object_list, number, paginator, more=False):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(BoundedCountMixin):
+    """
+    Keyset pagination over a queryset ordered by `fields`, newest first.
+
+    Pages are addressed by opaque cursor tokens encoding the ordering values of
+    the row at the page boundary, so every page is one range scan of
+    `per_page + 1` rows; no OFFSET and no COUNT(*). The bounded count is only
+    queried when a template asks for it.
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, object_list, per_page, fields=('publish_dt', 'id'), count_cap=COUNT_CAP, estimate=False):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.fields = tuple(fields)
+        self.count_cap = count_cap
+        self.estimate = estimate
+
+    def encode_cursor(self, obj, direction):
+        # isoformat keeps microseconds, which DjangoJSONEncoder would truncate
+        values = [getattr(obj, f) for f in self.fields]
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+        data = json.dumps([direction, values])
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in (self.NEXT, self.PREVIOUS) or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(f).to_python(v)
+                for f, v in zip(self.fields, values)
+            ]
+            if None in values:
+                raise InvalidCursor(cursor)
+        except (ValueError, TypeError, ValidationError, binascii.Error, UnicodeDecodeError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def boundary_q(self, values, lookup, fields=None):
+        """rows strictly past `values` in lexicographic order of `fields`"""
+        fields = fields or self.fields
+        q = Q()
+        for i, field in enumerate(fields):
+            q |= Q(
+                **{f: v for f, v in zip(fields[:i], values[:i])},
+                **{f'{field}__{lookup}': values[i]},
+            )
+        return q
+
+    def ordered(self, qs, direction, values=None, fields=None):
+        """`qs` ordered away from the cursor `values` in `direction`"""
+        fields = fields or self.fields
+        if direction == self.NEXT:
+            if values is not None:
+                qs = qs.filter(self.boundary_q(values, 'lt', fields))
+            return qs.order_by(*[f'-{f}' for f in fields])
+        return qs.filter(self.boundary_q(values, 'gt', fields)).order_by(*fields)
+
+    def fetch(self, direction, values, limit):
+        return list(self.ordered(self.object_list, direction, values)[:limit])
+
+    async def afetch(self, direction, values, limit):
+        return [obj async for obj in self.ordered(self.object_list, direction, values)[:limit]]
+
+    def page(self, cursor=None):
+        direction, values = self.parse_cursor(cursor)
+        return self.build_page(self.fetch(direction, values, self.per_page + 1), direction, values)
+
+    async def apage(self, cursor=None):
+        direction, values = self.parse_cursor(cursor)
+        return self.build_page(await self.afetch(direction, values, self.per_page + 1), direction, values)
+
+    def parse_cursor(self, cursor):
+        if cursor:
+            return self.decode_cursor(cursor)
+        return self.NEXT, None
+
+    def build_page(self, rows, direction, values):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == self.NEXT:
+            return CursorPage(rows, self, has_next=more, has_previous=values is not None)
+        return CursorPage(rows[::-1], self, has_next=True, has_previous=more)
+
+
+class CursorPage(object):
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, has_next=False, has_previous=False):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.encode_cursor(self.object_list[-1], CursorPaginator.NEXT)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.encode_cursor(self.object_list[0], CursorPaginator.PREVIOUS)
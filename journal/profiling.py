@@ -0,0 +1,118 @@
+"""
+A sampling profiler for single requests.
+
+A Sampler thread reads the stacks of the other threads every `interval`
+seconds and keeps those working on the profiled request: stacks passing
+through the `marker` frame, which is where the request entered the profiler,
+and, under ASGI, the busy stacks of the request's own thread for sync code
+(Django gives every request a ThreadSensitiveContext), or of any thread with
+threads=None when nothing else runs in the process. Samples only happen
+when the sampler gets the GIL, so the effective interval is at least
+sys.getswitchinterval().
+
+Samples are kept as collapsed stacks, the input format of flamegraph.pl and
+speedscope, and are broken down by the innermost frame that belongs to the
+ORM, template rendering or markdown.
+"""
+import sys
+import time
+import sysconfig
+import selectors
+import threading
+from collections import Counter
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+
+# category: path fragments of its frames, innermost matching frame wins
+CATEGORIES = {
+    'markdown': ('/markdown/', '/journal/rendering.py'),
+    'orm': ('/django/db/', '/psycopg'),
+    'template': ('/django/template/', '/journal/templatetags/'),
+}
+
+_busy = SyncToAsync.thread_handler.__code__
+# an event loop waiting for the threads running sync code
+_idle = selectors.__file__
+
+_path_prefixes = sorted(
+    {sysconfig.get_path(name) + '/' for name in ('stdlib', 'purelib', 'platlib')} | {f'{settings.BASE_DIR}/'},
+    key=len,
+    reverse=True,
+)
+
+
+def frame_name(code):
+    filename = code.co_filename
+    for prefix in _path_prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{code.co_qualname} ({filename}:{code.co_firstlineno})'
+
+
+def category(stack):
+    """the category of a stack of code objects, outermost first"""
+    for code in reversed(stack):
+        for name, fragments in CATEGORIES.items():
+            if any(fragment in code.co_filename for fragment in fragments):
+                return name
+    return 'other'
+
+
+class Sampler(threading.Thread):
+    """samples the stacks of a request until `stop` is called, use as a context manager"""
+    def __init__(self, marker, threads=(), interval=0.001):
+        super().__init__(name='journal-profiler', daemon=True)
+        self.marker = marker
+        self.threads = None if threads is None else set(threads)
+        self.interval = interval
+        self.samples = Counter()
+        self.seconds = 0.0
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        started = time.perf_counter()
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack, keep = [], False
+                while frame is not None:
+                    keep = keep or frame is self.marker or (
+                        frame.f_code is _busy and (self.threads is None or ident in self.threads)
+                    )
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if keep and stack[0].co_filename != _idle:
+                    self.samples[tuple(reversed(stack))] += 1
+        self.seconds = time.perf_counter() - started
+
+    def collapsed(self):
+        """one `frame;frame;frame count` line per distinct stack"""
+        lines = Counter()
+        for stack, count in self.samples.items():
+            lines[';'.join(frame_name(code) for code in stack)] += count
+        return ''.join(f'{stack} {count}\n' for stack, count in lines.most_common())
+
+    def breakdown(self):
+        """the share of samples per category"""
+        total = sum(self.samples.values()) or 1
+        shares = dict.fromkeys([*CATEGORIES, 'other'], 0.0)
+        for stack, count in self.samples.items():
+            shares[category(stack)] += count / total
+        return shares
+
+    def report(self, title):
+        lines = [f'{title}: {sum(self.samples.values())} samples over {self.seconds * 1000:.0f}ms', '']
+        lines += [f'{name:10} {share:6.1%}' for name, share in self.breakdown().items()]
+        return '\n'.join(lines) + '\n\n' + self.collapsed()
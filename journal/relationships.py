@@ -0,0 +1,133 @@
+"""
+How the request user relates to another user.
+
+The follower row and the latest follow request in each direction are read in
+one query, memoized on the request and cached across requests. The cache is
+invalidated from journal.signals whenever a Follower or FollowRequest between
+the two users changes.
+"""
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Subquery
+
+from journal import models
+
+CACHE_TIMEOUT = 60 * 5
+
+
+class Relationship(object):
+    def __init__(self, follower=None, request_from=None, request_to=None):
+        # request user follows the other user
+        self.follower = follower
+        # latest follow request from the other user to the request user
+        self.request_from = request_from
+        # latest follow request from the request user to the other user
+        self.request_to = request_to
+
+    def __repr__(self):
+        return (
+            f'<Relationship follower={self.follower!r} '
+            f'request_from={self.request_from!r} request_to={self.request_to!r}>'
+        )
+
+
+def cache_key(user_id, other_id):
+    return f'relationship:{user_id}:{other_id}'
+
+
+def invalidate(user_id, other_id):
+    cache.delete_many([
+        cache_key(user_id, other_id),
+        cache_key(other_id, user_id),
+    ])
+
+
+def state_query(user_id, other_id):
+    """one row holding the raw follower and request state between two users"""
+    def first(qs, field):
+        return Subquery(qs.values(field)[:1])
+
+    follower = models.Follower.objects.filter(user_from=user_id, user_to=other_id)
+    request_from = models.FollowRequest.objects.filter(
+        user_from=other_id,
+        user_to=user_id,
+    ).order_by('-requested')
+    request_to = models.FollowRequest.objects.filter(
+        user_from=user_id,
+        user_to=other_id,
+    ).order_by('-requested')
+    return get_user_model().objects.filter(pk=user_id).values(
+        follower_pk=first(follower, 'pk'),
+        follower_created=first(follower, 'created'),
+        request_from_pk=first(request_from, 'pk'),
+        request_from_status=first(request_from, 'status'),
+        request_to_pk=first(request_to, 'pk'),
+        request_to_status=first(request_to, 'status'),
+    )
+
+
+def fetch_state(user_id, other_id):
+    return state_query(user_id, other_id).first() or {}
+
+
+async def afetch_state(user_id, other_id):
+    return await state_query(user_id, other_id).afirst() or {}
+
+
+def build(user_id, other_id, state):
+    relationship = Relationship()
+    if state.get('follower_pk'):
+        relationship.follower = models.Follower(
+            pk=state['follower_pk'],
+            user_from_id=user_id,
+            user_to_id=other_id,
+            created=state['follower_created'],
+        )
+    if state.get('request_from_pk'):
+        relationship.request_from = models.FollowRequest(
+            pk=state['request_from_pk'],
+            user_from_id=other_id,
+            user_to_id=user_id,
+            status=state['request_from_status'],
+        )
+    if state.get('request_to_pk'):
+        relationship.request_to = models.FollowRequest(
+            pk=state['request_to_pk'],
+            user_from_id=user_id,
+            user_to_id=other_id,
+            status=state['request_to_status'],
+        )
+    return relationship
+
+
+def get_relationship(request, other_id):
+    """the Relationship of request.user to the user with pk `other_id`"""
+    if not request.user.is_authenticated:
+        return Relationship()
+
+    memo = request.__dict__.setdefault('_relationships', {})
+    if other_id not in memo:
+        key = cache_key(request.user.pk, other_id)
+        state = cache.get(key)
+        if state is None:
+            state = fetch_state(request.user.pk, other_id)
+            cache.set(key, state, CACHE_TIMEOUT)
+        memo[other_id] = build(request.user.pk, other_id, state)
+    return memo[other_id]
+
+
+async def aget_relationship(request, other_id):
+    """get_relationship for async views"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return Relationship()
+
+    memo = request.__dict__.setdefault('_relationships', {})
+    if other_id not in memo:
+        key = cache_key(user.pk, other_id)
+        state = await cache.aget(key)
+        if state is None:
+            state = await afetch_state(user.pk, other_id)
+            await cache.aset(key, state, CACHE_TIMEOUT)
+        memo[other_id] = build(user.pk, other_id, state)
+    return memo[other_id]
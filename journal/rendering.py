@@ -0,0 +1,33 @@
+import threading
+
+import markdown
+from django.utils.text import Truncator
+
+from journal import timing
+
+# bump whenever MARKDOWN_EXTENSIONS or the rendering itself changes so that
+# `manage.py render_markdown` re-renders every stored html field
+MARKDOWN_RENDERER_VERSION = 1
+MARKDOWN_EXTENSIONS = []
+
+# words of rendered html kept in the previews of list pages
+PREVIEW_WORDS = 60
+
+# building a Markdown instance costs as much as a short conversion, so each
+# thread keeps one and resets it between documents
+_local = threading.local()
+
+
+def render_markdown(text):
+    """convert markdown source to html with the current renderer settings"""
+    with timing.phase('markdown'):
+        md = getattr(_local, 'markdown', None)
+        if md is None:
+            md = _local.markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        return md.reset().convert(text)
+
+
+def render_preview(html):
+    """the first PREVIEW_WORDS words of rendered html with its tags closed, and whether it was cut"""
+    preview = Truncator(html).words(PREVIEW_WORDS, html=True, truncate=' …')
+    return preview, preview != html
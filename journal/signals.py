@@ -0,0 +1,224 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.backends.signals import connection_created
+
+from taggit.models import Tag, TaggedItem
+
+from journal import authentication
+from journal import models
+from journal import pagecache
+from journal import relationships
+from journal import sitemaps
+from journal import tagging
+from journal import timing
+from journal.models.journal import Visibility
+from journal.templatetags import entry_tags
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # fires again whenever the connection reconnects
+    if timing.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timing.record_query)
+
+
+@receiver(post_delete, sender=models.Follower)
+def remove_unfollowed_from_timeline(sender, instance, **kwargs):
+    models.TimelineEntry.objects.remove(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(post_save, sender=models.Follower)
+@receiver(post_delete, sender=models.Follower)
+@receiver(post_save, sender=models.FollowRequest)
+@receiver(post_delete, sender=models.FollowRequest)
+def invalidate_relationship(sender, instance, **kwargs):
+    relationships.invalidate(instance.user_from_id, instance.user_to_id)
+
+
+@receiver(post_save, sender=models.Follower)
+@receiver(post_delete, sender=models.Follower)
+def refresh_follow_counters(sender, instance, signal, **kwargs):
+    profiles = models.Profile.objects.filter(pk__in=[instance.user_from_id, instance.user_to_id])
+    # an author losing followers may drop back to fan-out, see TimelineEntryManager.
+    # Both profiles are checked as unfollowing deletes the mirrored row too, and
+    # whichever receiver runs first recounts for both
+    pull_authors = profiles.filter(
+        follower_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT,
+    ).values_list('pk', flat=True)
+    was_pull = set(pull_authors) if signal is post_delete else set()
+    profiles.refresh_counters('follower_count', 'following_count')
+    if was_pull:
+        was_pull.difference_update(pull_authors.all())
+    for author_id in was_pull:
+        # entries written while they were pulled are in none of their followers' feeds
+        models.TimelineEntry.objects.refan_author(author_id)
+
+
+@receiver(m2m_changed, sender=models.Follower)
+def following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # following.add() bulk creates Follower rows without post_save,
+    # removals are covered by the Follower post_delete receivers
+    if action == 'pre_clear':
+        pk_set = set(instance.following.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    for pk in pk_set or ():
+        relationships.invalidate(instance.pk, pk)
+    if action == 'post_add' and pk_set:
+        # add() inserts the mirrored rows of the symmetrical relation after this
+        # signal and sends none for them, they are inserted first so the recount
+        # sees them and add() then finds them present
+        models.Follower.objects.bulk_create(
+            [models.Follower(user_from_id=pk, user_to_id=instance.pk) for pk in pk_set],
+            ignore_conflicts=True,
+        )
+        models.Profile.objects.filter(
+            pk__in=[instance.pk, *pk_set],
+        ).refresh_counters('follower_count', 'following_count')
+        authentication.invalidate(instance.pk, *pk_set)
+
+
+@receiver(post_delete, sender=models.Entry)
+def decrement_entry_count(sender, instance, **kwargs):
+    models.Profile.objects.filter(pk=instance.author_id).update(
+        # a counter that drifted to 0 stays there instead of violating its check constraint
+        entry_count=Greatest(F('entry_count') - 1, 0),
+    )
+
+
+@receiver(post_save, sender=models.Author)
+@receiver(post_delete, sender=models.Author)
+def invalidate_author_sitemap(sender, instance, **kwargs):
+    sitemaps.invalidate('authors')
+
+
+@receiver(post_save, sender=models.Book)
+@receiver(post_delete, sender=models.Book)
+def invalidate_book_sitemap(sender, instance, **kwargs):
+    sitemaps.invalidate('books')
+
+
+@receiver(m2m_changed, sender=models.Book.authors.through)
+def book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # a book page lists its authors, so they count as a modification of the book
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        books = models.Book.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        books = models.Book.objects.filter(authors=instance)
+    else:
+        books = models.Book.objects.filter(pk__in=pk_set or ())
+    books.update(updated=timezone.now())
+    sitemaps.invalidate('books')
+
+
+@receiver(post_save, sender=models.Entry)
+@receiver(post_delete, sender=models.Entry)
+@receiver(post_save, sender=models.Profile)
+def invalidate_journal_sitemaps(sender, instance, **kwargs):
+    sitemaps.invalidate('journals', 'entries')
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def entry_tags_changed(sender, instance, action, **kwargs):
+    # cached entry cards are keyed on Entry.updated, see journal.templatetags.entry_tags
+    if not isinstance(instance, models.Entry) or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    instance.updated = timezone.now()
+    models.Entry.objects.filter(pk=instance.pk).update(updated=instance.updated)
+    sitemaps.invalidate('journals', 'entries')
+    purge_entry_pages(sender, instance)
+    models.TagUsage.objects.refresh(instance.author_id, [instance.book_id])
+    tagging.invalidate(instance.author_id)
+
+
+@receiver(post_save, sender=models.Entry)
+@receiver(post_delete, sender=models.Entry)
+def purge_entry_pages(sender, instance, **kwargs):
+    tags = [pagecache.user_tag(instance.author_id)]
+    # Entry.save updates the loaded state only after post_save
+    states = (instance.feed_state(), getattr(instance, '_loaded_feed_state', None) or ())
+    if any(state[:2] == (models.Entry.Status.PUBLISHED, Visibility.PUBLIC) for state in states):
+        tags.append('entries')
+    pagecache.purge(*tags)
+
+
+@receiver(post_save, sender=models.Profile)
+def purge_profile_pages(sender, instance, **kwargs):
+    # a journal visibility change can add or remove entries from discover
+    pagecache.purge(pagecache.user_tag(instance.pk), 'entries')
+
+
+@receiver(post_save, sender=models.Book)
+@receiver(post_delete, sender=models.Book)
+def purge_book_pages(sender, instance, **kwargs):
+    pagecache.purge('books', pagecache.book_tag(instance.pk))
+
+
+@receiver(m2m_changed, sender=models.Book.authors.through)
+def purge_book_author_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # pages still showing a removed author are tagged with that author
+        tags = [pagecache.author_tag(instance.pk), *(pagecache.book_tag(pk) for pk in pk_set or ())]
+    else:
+        tags = [pagecache.book_tag(instance.pk)]
+    pagecache.purge('books', *tags)
+
+
+@receiver(post_save, sender=models.Author)
+@receiver(post_delete, sender=models.Author)
+def purge_author_pages(sender, instance, **kwargs):
+    pagecache.purge('authors', pagecache.author_tag(instance.pk))
+
+
+@receiver(post_save, sender=models.Entry)
+def invalidate_tag_cloud(sender, instance, created, **kwargs):
+    # Entry.save refreshes the TagUsage rows and then the loaded state
+    if not created and instance.tag_usage_state() != getattr(instance, '_loaded_tag_usage_state', None):
+        tagging.invalidate(instance.author_id)
+
+
+@receiver(post_delete, sender=models.Entry)
+def remove_deleted_tag_usage(sender, instance, **kwargs):
+    models.TagUsage.objects.refresh(instance.author_id, [instance.book_id])
+    tagging.invalidate(instance.author_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def forget_tags(sender, instance, **kwargs):
+    # a renamed tag may be cached under its old slug
+    tagging.clear_tags()
+    tagging.invalidate()
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=models.Profile)
+@receiver(post_delete, sender=models.Profile)
+def invalidate_cached_user(sender, instance, **kwargs):
+    authentication.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_entry_cards(sender, instance, update_fields=None, **kwargs):
+    # cards show the author's username, logins only save last_login
+    if update_fields is None or 'username' in update_fields:
+        entry_tags.invalidate_author(instance.pk)
+
+
+@receiver(post_save, sender=models.FollowRequest)
+@receiver(post_delete, sender=models.FollowRequest)
+@receiver(post_save, sender=models.Follower)
+@receiver(post_delete, sender=models.Follower)
+def invalidate_cached_users_counters(sender, instance, **kwargs):
+    # the profile counters are updated in bulk, without Profile signals
+    authentication.invalidate(instance.user_from_id, instance.user_to_id)
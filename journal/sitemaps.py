@@ -1,21 +1,145 @@
+"""
+Sitemaps of the catalog and of public journals.
+
+/sitemap.xml is an index pointing at one paged sitemap per section. Each
+section loads only the columns its urls and lastmod need, and the latest
+lastmod of a section is a single aggregate rather than a scan of its items.
+
+Rendered responses are cached per section. Every section has a version token
+in the cache that is replaced by `invalidate`, called from journal.signals and
+the bulk importer whenever the content a section lists changes.
+"""
+import time
+from functools import wraps
+
+from django.urls import reverse
+from django.db.models import Max, OuterRef, Subquery
+from django.core.cache import cache
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps import views as sitemap_views
 
 import journal.models as models
+from journal.models.journal import Visibility
 
-# todo: last mod
+CACHE_TIMEOUT = 60 * 60 * 6
 
 
-class AuthorSitemap(Sitemap):
-    changefreq = 'weekly'
-    priority = 0.9
+class ModelSitemap(Sitemap):
+    """items are loaded with just `fields` and in a stable order for paging"""
+    limit = 5000
+    model = None
+    fields = ('pk', 'updated')
+    ordering = ('pk',)
+
+    def get_queryset(self):
+        return self.model.objects.all()
 
     def items(self):
-        return models.Author.objects.all()
+        return self.get_queryset().only(*self.fields).order_by(*self.ordering)
+
+    def lastmod(self, item):
+        return item.updated
+
+    def get_latest_lastmod(self):
+        return self.get_queryset().aggregate(latest=Max('updated'))['latest']
 
 
-class BookSitemap(Sitemap):
+class AuthorSitemap(ModelSitemap):
     changefreq = 'weekly'
     priority = 0.9
+    model = models.Author
+
+
+class BookSitemap(ModelSitemap):
+    changefreq = 'weekly'
+    priority = 0.9
+    model = models.Book
+
+
+class EntrySitemap(ModelSitemap):
+    changefreq = 'monthly'
+    priority = 0.6
+    model = models.Entry
+    fields = ('pk', 'author_id', 'updated')
+    # the order of entry_visibility_feed_idx
+    ordering = ('publish_dt', 'id')
+
+    def get_queryset(self):
+        return models.Entry.objects.public()
+
+
+class JournalSitemap(ModelSitemap):
+    changefreq = 'daily'
+    priority = 0.7
+    model = models.Profile
+    fields = ('pk',)
+
+    def get_queryset(self):
+        return models.Profile.objects.filter(journal_visibility=Visibility.PUBLIC, entry_count__gt=0)
 
     def items(self):
-        return models.Book.objects.all()
+        # the latest public entry of each journal, only computed for the rows of the page
+        return super().items().annotate(
+            lastmod=Subquery(
+                models.Entry.objects.public().filter(
+                    author=OuterRef('pk'),
+                ).order_by('-updated').values('updated')[:1]
+            ),
+        )
+
+    def location(self, item):
+        return reverse('journal', args=[item.pk])
+
+    def lastmod(self, item):
+        return item.lastmod
+
+    def get_latest_lastmod(self):
+        # entries are only public in public journals
+        return models.Entry.objects.public().aggregate(latest=Max('updated'))['latest']
+
+
+SITEMAPS = {
+    'authors': AuthorSitemap,
+    'books': BookSitemap,
+    'journals': JournalSitemap,
+    'entries': EntrySitemap,
+}
+
+
+def version_key(section):
+    return f'sitemap:version:{section}'
+
+
+def invalidate(*sections):
+    """drop the cached sitemaps of `sections`, default all"""
+    cache.set_many({version_key(section): time.time_ns() for section in sections or SITEMAPS}, None)
+
+
+def cached(view):
+    """cache the rendered response of a sitemap view until one of its sections is invalidated"""
+    @wraps(view)
+    def wrapper(request, section=None):
+        sections = [section] if section in SITEMAPS else list(SITEMAPS)
+        versions = cache.get_many([version_key(s) for s in sections])
+        missing = {version_key(s): time.time_ns() for s in sections if version_key(s) not in versions}
+        if missing:
+            cache.set_many(missing, None)
+            versions.update(missing)
+        key = 'sitemap:{}:{}'.format(
+            request.build_absolute_uri(),
+            ':'.join(str(versions[version_key(s)]) for s in sections),
+        )
+        response = cache.get(key)
+        if response is None:
+            kwargs = {'section': section} if section else {}
+            response = view(request, SITEMAPS, **kwargs)
+            response.render()
+            if response.status_code == 200:
+                cache.set(key, response, CACHE_TIMEOUT)
+        return response
+
+    return wrapper
+
+
+index = cached(sitemap_views.index)
+sitemap = cached(sitemap_views.sitemap)
@@ -0,0 +1,59 @@
+// Adds a search box in front of every <select data-autocomplete-url>.
+// Matches are fetched as the user types; picking one adds it to the select.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.placeholder = 'Search…';
+        input.autocomplete = 'off';
+        var results = document.createElement('ul');
+        results.className = 'autocomplete-results';
+        select.before(input, results);
+
+        var timer = null;
+        var controller = null;
+
+        function choose(result) {
+            var option = select.querySelector('option[value="' + result.id + '"]');
+            if (!option) {
+                option = new Option(result.text, result.id);
+                select.add(option);
+            }
+            option.selected = true;
+            input.value = '';
+            results.replaceChildren();
+        }
+
+        function search() {
+            var term = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (!term) {
+                results.replaceChildren();
+                return;
+            }
+            controller = new AbortController();
+            var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(term);
+            fetch(url, {signal: controller.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    results.replaceChildren.apply(results, data.results.map(function (result) {
+                        var item = document.createElement('li');
+                        var button = document.createElement('button');
+                        button.type = 'button';
+                        button.textContent = result.text;
+                        button.addEventListener('click', function () { choose(result); });
+                        item.append(button);
+                        return item;
+                    }));
+                })
+                .catch(function () {});
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+    });
+});
@@ -0,0 +1,117 @@
+"""
+Tag lookups and tag clouds.
+
+Tags change rarely and are looked up by slug on every filtered journal or
+discover page, so `get_tag` keeps them in a bounded in-process cache. Entries
+expire after TAG_TIMEOUT so other processes see renamed tags; saved and
+deleted tags are forgotten right away in this process by journal.signals.
+Unknown slugs are not cached, they are looked up again.
+
+Tag clouds are built from TagUsage (see journal.models.journal) and cached
+under a version token per user, replaced by `invalidate` from journal.signals
+and the bulk importer whenever the tags of the user's entries change, and
+under a version token for all users replaced when a tag changes.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from taggit.models import Tag
+
+from journal import models
+
+TAG_TIMEOUT = 60 * 5
+TAG_CACHE_SIZE = 10000
+
+CLOUD_SIZE = 50
+CLOUD_WEIGHTS = 5
+CLOUD_TIMEOUT = 60 * 60 * 6
+
+_tags = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_tag(slug):
+    """the Tag with `slug` or None"""
+    now = time.monotonic()
+    with _lock:
+        cached = _tags.get(slug)
+        if cached is not None and cached[1] > now:
+            _tags.move_to_end(slug)
+            return cached[0]
+    tag = Tag.objects.filter(slug=slug).first()
+    if tag is not None:
+        with _lock:
+            _tags[slug] = (tag, now + TAG_TIMEOUT)
+            _tags.move_to_end(slug)
+            while len(_tags) > TAG_CACHE_SIZE:
+                _tags.popitem(last=False)
+    return tag
+
+
+aget_tag = sync_to_async(get_tag)
+
+
+def forget_tag(*slugs):
+    with _lock:
+        for slug in slugs:
+            _tags.pop(slug, None)
+
+
+def clear_tags():
+    with _lock:
+        _tags.clear()
+
+
+def version_key(user_id=None):
+    return f'tag-cloud:version:{"all" if user_id is None else user_id}'
+
+
+def invalidate(user_id=None):
+    """drop the cached tag clouds of a user, default all users"""
+    cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def weigh(rows):
+    """tags by name, weighed 1 to CLOUD_WEIGHTS on a log scale of their counts"""
+    rows = sorted(rows, key=lambda row: row['tag__name'].lower())
+    if not rows:
+        return []
+    low = math.log(min(row['count'] for row in rows))
+    spread = math.log(max(row['count'] for row in rows)) - low
+    return [
+        {
+            'name': row['tag__name'],
+            'slug': row['tag__slug'],
+            'count': row['count'],
+            'weight': 1 + round((math.log(row['count']) - low) / spread * (CLOUD_WEIGHTS - 1)) if spread else 1,
+        }
+        for row in rows
+    ]
+
+
+def tag_cloud(user_id, visibility, book_id=None):
+    """the cloud of the tags of the user's entries, on one book if given, that a reader allowed `visibility` sees"""
+    keys = [version_key(), version_key(user_id)]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    key = 'tag-cloud:{}:{}:{}:{}'.format(
+        user_id,
+        int(visibility),
+        book_id or '',
+        ':'.join(str(versions[key]) for key in keys),
+    )
+    cloud = cache.get(key)
+    if cloud is None:
+        cloud = weigh(list(models.TagUsage.objects.cloud(user_id, visibility, book_id)[:CLOUD_SIZE]))
+        cache.set(key, cloud, CLOUD_TIMEOUT)
+    return cloud
+
+
+atag_cloud = sync_to_async(tag_cloud)
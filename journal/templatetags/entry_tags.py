@@ -1,11 +1,111 @@
-import markdown
+import time
 
 from django import template
+from django.core.cache import cache
+from django.utils import timezone, translation
+from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
 
+from journal.rendering import MARKDOWN_RENDERER_VERSION, render_markdown
+
 register = template.Library()
 
+# fragment keys change with Entry.updated, so stale fragments just expire
+ENTRY_CARD_TIMEOUT = 60 * 60 * 24
+
+
+@register.filter
+def query_string(params):
+    """`params` urlencoded, list values repeat their key"""
+    return urlencode(params, doseq=True)
+
 
 @register.filter(name='markdown')
-def markdown_format(text):
-    return mark_safe(markdown.markdown(text))
+def markdown_format(value, field=None):
+    """
+    Render markdown as html.
+
+    Given a model instance and a field name, e.g. ``entry|markdown:'body'``,
+    the html stored alongside that field is served instead of rendering it.
+    """
+    if field is None:
+        return mark_safe(render_markdown(value))
+    return mark_safe(value.get_markdown_html(field))
+
+
+@register.filter
+def preview(entry):
+    """the start of the entry's rendered body, see Entry.preview_html"""
+    return mark_safe(entry.get_preview_html())
+
+
+def author_version_key(user_id):
+    return f'entry-card:author:{user_id}'
+
+
+def invalidate_author(*user_ids):
+    """drop the cached cards of the authors' entries, called from journal.signals when a user is renamed"""
+    cache.set_many({author_version_key(pk): time.time_ns() for pk in user_ids}, None)
+
+
+def author_versions(context, user_ids):
+    """the card version tokens of authors, read once per render"""
+    versions = context.render_context.setdefault('entry_card_authors', {})
+    keys = {author_version_key(pk): pk for pk in set(user_ids) if pk not in versions}
+    if keys:
+        found = cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in found}
+        if missing:
+            cache.set_many(missing, None)
+            found.update(missing)
+        versions.update((keys[key], version) for key, version in found.items())
+    return versions
+
+
+def entry_card_key(template_name, entry, user, author_version):
+    """
+    Everything a rendered entry template depends on: the entry as of its last
+    save (tag changes bump `updated` too, see journal.signals), its book and
+    author, whether the viewer owns it, and the renderer, timezone and language.
+    """
+    return 'entry-card:{}:{}:{}:{}:{}:{}:{}:{}:{}'.format(
+        template_name,
+        entry.pk,
+        entry.updated.timestamp(),
+        entry.book.updated.timestamp(),
+        author_version,
+        int(user.pk == entry.author_id),
+        MARKDOWN_RENDERER_VERSION,
+        timezone.get_current_timezone_name(),
+        translation.get_language(),
+    )
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_entry_cards(context, entries, template_name):
+    """load the cached cards of all `entries` with one cache read ahead of a loop of `entry_card`"""
+    versions = author_versions(context, [entry.author_id for entry in entries])
+    keys = [
+        entry_card_key(template_name, entry, context.request.user, versions[entry.author_id])
+        for entry in entries
+    ]
+    cached = cache.get_many(keys)
+    # misses are kept as None so entry_card doesn't ask the cache again
+    context.render_context.setdefault('entry_cards', {}).update((key, cached.get(key)) for key in keys)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def entry_card(context, template_name, entry):
+    """`template_name` rendered for `entry`, cached per entry and viewer"""
+    version = author_versions(context, [entry.author_id])[entry.author_id]
+    key = entry_card_key(template_name, entry, context.request.user, version)
+    prefetched = context.render_context.get('entry_cards', {})
+    html = prefetched[key] if key in prefetched else cache.get(key)
+    if html is None:
+        # rendered like {% include %} would
+        card = context.template.engine.get_template(template_name)
+        with context.render_context.push_state(card, isolated_context=False), context.push(entry=entry):
+            html = card.render(context)
+        cache.set(key, html, ENTRY_CARD_TIMEOUT)
+    return mark_safe(html)
@@ -1,3 +1,1206 @@
-from django.test import TestCase
+import io
+import os
+import re
+import sys
+import json
+import base64
+import time
+import threading
+import zipfile
+import tempfile
+from io import StringIO
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test.utils import CaptureQueriesContext
+
+from journal import authentication
+from journal import benchmarks
+from journal import facets
+from journal import forms
+from journal import importers
+from journal import models
+from journal import profiling
+from journal import relationships
+from journal import tagging
+from journal import timing
+from journal import views
+from journal.models.journal import Visibility
+from journal.rendering import render_markdown
+
+
+class JournalTestCase(TestCase):
+    """a reader and a writer with profiles and a book, and an empty cache for every test"""
+    journal_visibility = Visibility.FOLLOWERS
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        cls.writer = User.objects.create_user('writer', 'writer@example.com', 'pw')
+        for user in (cls.reader, cls.writer):
+            models.Profile.objects.create(user=user, journal_visibility=cls.journal_visibility)
+        cls.book = models.Book.objects.create(title='Moby Dick')
+
+    def setUp(self):
+        cache.clear()
+
+
+class EntryListQueryBudgetTests(JournalTestCase):
+    """entry list pages must issue the same number of queries regardless of page size"""
+    budget = 15
+    journal_visibility = Visibility.PUBLIC
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.reader.following.add(cls.writer)
+        cls.book.authors.add(
+            models.Author.objects.create(first_name='Herman', last_name='Melville'),
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.reader)
+
+    def add_entries(self, n):
+        for i in range(n):
+            book = models.Book.objects.create(title=f'Book {i}')
+            book.authors.add(models.Author.objects.create(last_name=f'Author {i}'))
+            for author, book in ((self.reader, book), (self.writer, self.book)):
+                entry = models.Entry.objects.create(
+                    author=author,
+                    book=book,
+                    body=f'entry *{i}*',
+                    visibility=Visibility.PUBLIC,
+                )
+                entry.tags.add(f'tag-{i}', 'shared')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_constant_queries(self, url):
+        # warm up per-user caches so both measured requests see the same state
+        self.add_entries(2)
+        self.client.get(url)
+        small = self.count_queries(url)
+        self.add_entries(10)
+        self.client.get(url)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.budget)
+
+    def test_journal(self):
+        self.assert_constant_queries(reverse('journal', args=[self.reader.pk]))
+
+    def test_journal_other_user(self):
+        self.assert_constant_queries(reverse('journal', args=[self.writer.pk]))
+
+    def test_journal_book(self):
+        self.assert_constant_queries(reverse('journal_book', args=[self.writer.pk, self.book.pk]))
+
+    def test_discover(self):
+        self.assert_constant_queries(reverse('discover'))
+
+    def test_discover_book(self):
+        self.assert_constant_queries(reverse('discover_book', args=[self.book.pk]))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'pw')
+        models.Profile.objects.create(user=cls.user)
+        book = models.Book.objects.create(title='Moby Dick')
+        publish_dt = timezone.now()
+        # pairs of entries share a publish_dt so the id tie-breaker is exercised
+        for i in range(7):
+            models.Entry.objects.create(
+                author=cls.user,
+                book=book,
+                body=f'entry {i}',
+                publish_dt=publish_dt - timedelta(days=i // 2),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('journal', args=[self.user.pk])
+
+    def get_page(self, cursor=None):
+        response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    @mock.patch.object(views.Journal, 'paginate_by', 3)
+    def test_walks_all_entries_forwards_and_backwards(self):
+        expected = list(
+            models.Entry.objects.order_by('-publish_dt', '-id').values_list('pk', flat=True)
+        )
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(pages[-1].next_cursor))
+        self.assertEqual([e.pk for page in pages for e in page], expected)
+        self.assertEqual(len(pages), 3)
+
+        page = pages[-1]
+        backwards = [[e.pk for e in page]]
+        while page.has_previous():
+            page = self.get_page(page.previous_cursor)
+            backwards.insert(0, [e.pk for e in page])
+        self.assertEqual(backwards, [[e.pk for e in page] for page in pages])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor(self):
+        for values in (['not-a-date', 1], ['2024-01-01T00:00:00+00:00', 'x'], [None, None]):
+            cursor = base64.urlsafe_b64encode(json.dumps(['n', values]).encode()).decode()
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class EffectiveVisibilityTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('writer', 'writer@example.com', 'pw')
+        self.profile = models.Profile.objects.create(
+            user=self.user,
+            journal_visibility=Visibility.FOLLOWERS,
+        )
+        self.entry = models.Entry.objects.create(
+            author=self.user,
+            book=models.Book.objects.create(title='Moby Dick'),
+            body='entry',
+            visibility=Visibility.PUBLIC,
+        )
+
+    def assert_effective_visibility(self, visibility):
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.effective_visibility, visibility)
+
+    def test_capped_by_journal_visibility(self):
+        self.assert_effective_visibility(Visibility.FOLLOWERS)
+
+    def test_follows_journal_visibility_changes(self):
+        profile = models.Profile.objects.get(pk=self.profile.pk)
+        profile.journal_visibility = Visibility.PUBLIC
+        profile.save()
+        self.assert_effective_visibility(Visibility.PUBLIC)
+        profile.journal_visibility = Visibility.PRIVATE
+        profile.save()
+        self.assert_effective_visibility(Visibility.PRIVATE)
+
+    def test_follows_entry_visibility_changes(self):
+        self.entry.visibility = Visibility.PRIVATE
+        self.entry.save(update_fields=['visibility'])
+        self.assert_effective_visibility(Visibility.PRIVATE)
+
+
+class FollowingFeedTests(JournalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_entry = self.write(Visibility.FOLLOWERS)
+        self.client.force_login(self.reader)
+
+    def write(self, visibility):
+        return models.Entry.objects.create(
+            author=self.writer,
+            book=self.book,
+            body='entry',
+            visibility=visibility,
+        )
+
+    def follow(self):
+        models.FollowRequest.objects.create(user_from=self.reader, user_to=self.writer).accept()
+
+    def feed(self):
+        response = self.client.get(reverse('following_feed'))
+        self.assertEqual(response.status_code, 200)
+        return [e.pk for e in response.context['entries']]
+
+    def test_accept_backfills_and_new_entries_fan_out(self):
+        self.write(Visibility.PRIVATE)
+        self.assertEqual(self.feed(), [])
+        self.follow()
+        self.assertEqual(self.feed(), [self.old_entry.pk])
+        new_entry = self.write(Visibility.PUBLIC)
+        self.assertEqual(self.feed(), [new_entry.pk, self.old_entry.pk])
+
+    def test_visibility_changes_update_feed(self):
+        self.follow()
+        self.old_entry.visibility = Visibility.PRIVATE
+        self.old_entry.save()
+        self.assertEqual(self.feed(), [])
+        self.old_entry.visibility = Visibility.FOLLOWERS
+        self.old_entry.save()
+        self.assertEqual(self.feed(), [self.old_entry.pk])
+
+        profile = models.Profile.objects.get(user=self.writer)
+        profile.journal_visibility = Visibility.PRIVATE
+        profile.save()
+        self.assertEqual(self.feed(), [])
+
+    def test_refan_author(self):
+        User = get_user_model()
+        for name in ('second', 'third'):
+            models.Profile.objects.create(user=User.objects.create_user(name, f'{name}@example.com', 'pw'))
+            User.objects.get(username=name).following.add(self.writer)
+        self.follow()
+        models.TimelineEntry.objects.all().delete()
+        # the delete, the pull author check and one insert for all followers
+        with self.assertNumQueries(3):
+            models.TimelineEntry.objects.refan_author(self.writer.pk)
+        self.assertEqual(models.TimelineEntry.objects.filter(entry=self.old_entry).count(), 3)
+        self.assertEqual(self.feed(), [self.old_entry.pk])
+
+    def test_unfollow_removes_entries(self):
+        self.follow()
+        self.reader.following.remove(self.writer)
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_LIMIT=1)
+    def test_authors_losing_followers_are_fanned_out_again(self):
+        other = get_user_model().objects.create_user('other', 'other@example.com', 'pw')
+        models.Profile.objects.create(user=other)
+        self.follow()
+        other.following.add(self.writer)
+        self.assertTrue(models.TimelineEntry.objects.is_pull_author(self.writer.pk))
+        pulled_entry = self.write(Visibility.FOLLOWERS)
+        other.following.remove(self.writer)
+        self.assertFalse(models.TimelineEntry.objects.is_pull_author(self.writer.pk))
+        self.assertCountEqual(
+            models.TimelineEntry.objects.filter(user=self.reader).values_list('entry', flat=True),
+            [pulled_entry.pk, self.old_entry.pk],
+        )
+        self.assertEqual(self.feed(), [pulled_entry.pk, self.old_entry.pk])
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_LIMIT=0)
+    def test_widely_followed_authors_are_pulled(self):
+        self.follow()
+        new_entry = self.write(Visibility.FOLLOWERS)
+        self.assertFalse(models.TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_entry.pk, self.old_entry.pk])
+
+
+class RelationshipTests(JournalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.reader)
+        self.url = reverse('user_detail', args=[self.writer.pk])
+
+    def test_request_follow_and_accept(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        follow_request = models.FollowRequest.objects.create(user_from=self.reader, user_to=self.writer)
+        state = relationships.fetch_state(self.writer.pk, self.reader.pk)
+        self.assertEqual(state['request_from_pk'], follow_request.pk)
+        self.assertIsNone(state['follower_pk'])
+
+        follow_request.accept()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['follower'].user_to_id, self.writer.pk)
+
+    def test_cached_across_requests_until_follow_changes(self):
+        self.reader.following.add(self.writer)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(2):
+            # session and the user detail; no identity or relationship queries
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.reader.following.remove(self.writer)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class AuthenticationTests(JournalTestCase):
+    def test_login_by_email_in_any_case(self):
+        self.assertTrue(self.client.login(username='reader@EXAMPLE.com', password='pw'))
+        self.assertFalse(self.client.login(username='reader@example.com', password='wrong'))
+
+    def test_emails_unique_in_any_case(self):
+        form = forms.UserRegistrationForm({
+            'username': 'copycat',
+            'email': 'READER@example.com',
+            'password': 'a long passphrase',
+            'password2': 'a long passphrase',
+        })
+        self.assertIn('email', form.errors)
+        self.assertFalse(forms.EmailUpdateForm({'email': 'reader@example.COM'}, instance=self.writer).is_valid())
+        self.assertTrue(forms.EmailUpdateForm({'email': 'reader@example.com'}, instance=self.reader).is_valid())
+
+    def test_user_and_profile_cached_until_they_change(self):
+        with self.assertNumQueries(1):
+            user = authentication.get_cached_user(self.reader.pk)
+            self.assertEqual(user.profile.follow_request_count, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(authentication.get_cached_user(self.reader.pk), self.reader)
+
+        models.FollowRequest.objects.create(user_from=self.writer, user_to=self.reader)
+        self.assertEqual(authentication.get_cached_user(self.reader.pk).profile.follow_request_count, 1)
+        profile = models.Profile.objects.get(user=self.reader)
+        profile.about = 'updated'
+        profile.save()
+        self.assertEqual(authentication.get_cached_user(self.reader.pk).profile.about, 'updated')
+
+    def test_inactive_users_are_logged_out(self):
+        self.client.force_login(self.reader)
+        self.reader.is_active = False
+        self.reader.save()
+        self.assertFalse(self.client.get(reverse('index')).context['user'].is_authenticated)
+
+
+class ProfileCounterTests(JournalTestCase):
+    def counters(self, user):
+        profile = models.Profile.objects.get(user=user)
+        return {f: getattr(profile, f) for f in models.Profile.COUNTER_FIELDS}
+
+    def test_follow_request_and_follower_counts(self):
+        follow_request = models.FollowRequest.objects.create(user_from=self.reader, user_to=self.writer)
+        self.assertEqual(self.counters(self.writer)['follow_request_count'], 1)
+
+        follow_request.accept()
+        for user in (self.reader, self.writer):
+            self.assertEqual(
+                self.counters(user),
+                {'follow_request_count': 0, 'follower_count': 1, 'following_count': 1, 'entry_count': 0},
+            )
+
+        self.reader.following.remove(self.writer)
+        self.assertEqual(self.counters(self.writer)['follower_count'], 0)
+        self.assertEqual(self.counters(self.reader)['following_count'], 0)
+
+    def test_entry_count(self):
+        entries = [
+            models.Entry.objects.create(author=self.writer, book=self.book, body='entry')
+            for _ in range(3)
+        ]
+        entries[0].delete()
+        self.assertEqual(self.counters(self.writer)['entry_count'], 2)
+
+        models.Profile.objects.filter(user=self.writer).update(entry_count=0)
+        entries[1].delete()
+        self.assertEqual(self.counters(self.writer)['entry_count'], 0)
+
+    def test_profile_save_keeps_counters(self):
+        profile = models.Profile.objects.get(user=self.writer)
+        models.FollowRequest.objects.create(user_from=self.reader, user_to=self.writer)
+        profile.about = 'updated'
+        profile.save()
+        self.assertEqual(self.counters(self.writer)['follow_request_count'], 1)
+
+    def test_reconcile_command(self):
+        models.FollowRequest.objects.create(user_from=self.reader, user_to=self.writer)
+        models.Profile.objects.update(follow_request_count=5, follower_count=3)
+        call_command('reconcile_profile_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.writer)['follow_request_count'], 1)
+        self.assertEqual(self.counters(self.reader)['follower_count'], 0)
+
+
+class TagCloudTests(JournalTestCase):
+    journal_visibility = Visibility.PUBLIC
+
+    def setUp(self):
+        super().setUp()
+        self.other_book = models.Book.objects.create(title='Typee')
+        for visibility, tags in (
+            (Visibility.PUBLIC, ['whales', 'sea']),
+            (Visibility.PUBLIC, ['whales']),
+            (Visibility.FOLLOWERS, ['whales', 'ahab']),
+            (Visibility.PRIVATE, ['secret']),
+        ):
+            entry = models.Entry.objects.create(author=self.writer, book=self.book, body='entry', visibility=visibility)
+            entry.tags.add(*tags)
+        self.draft = models.Entry.objects.create(
+            author=self.writer,
+            book=self.other_book,
+            body='draft',
+            visibility=Visibility.PUBLIC,
+            status=models.Entry.Status.DRAFT,
+        )
+        self.draft.tags.add('islands')
+
+    def cloud(self, visibility, book=None):
+        return {
+            tag['slug']: tag['count']
+            for tag in tagging.tag_cloud(self.writer.pk, visibility, book and book.pk)
+        }
+
+    def test_counts_by_visibility(self):
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 1})
+        self.assertEqual(self.cloud(Visibility.FOLLOWERS), {'whales': 3, 'sea': 1, 'ahab': 1})
+        self.assertEqual(
+            self.cloud(Visibility.PRIVATE),
+            {'whales': 3, 'sea': 1, 'ahab': 1, 'secret': 1, 'islands': 1},
+        )
+        self.assertEqual(self.cloud(Visibility.PRIVATE, self.other_book), {'islands': 1})
+
+    def test_weights(self):
+        weights = {tag['slug']: tag['weight'] for tag in tagging.tag_cloud(self.writer.pk, Visibility.PRIVATE)}
+        self.assertEqual(weights['whales'], tagging.CLOUD_WEIGHTS)
+        self.assertEqual(weights['sea'], 1)
+
+    def test_invalidated_by_entry_changes(self):
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 1})
+        self.draft.status = models.Entry.Status.PUBLISHED
+        self.draft.save()
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 1, 'islands': 1})
+        self.draft.tags.add('sea')
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 2, 'islands': 1})
+        self.draft.book = self.book
+        self.draft.save()
+        self.assertEqual(self.cloud(Visibility.PUBLIC, self.other_book), {})
+        self.draft.delete()
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 1})
+
+    def test_journal_shows_the_readers_cloud(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('journal', args=[self.writer.pk]))
+        self.assertEqual([tag['slug'] for tag in response.context['tag_cloud']], ['sea', 'whales'])
+        self.assertContains(response, 'href="?tag=whales"')
+
+        self.reader.following.add(self.writer)
+        response = self.client.get(reverse('journal', args=[self.writer.pk]))
+        self.assertEqual([tag['slug'] for tag in response.context['tag_cloud']], ['ahab', 'sea', 'whales'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cloud(Visibility.FOLLOWERS), {'whales': 3, 'sea': 1, 'ahab': 1})
+
+    def test_tag_lookup_cached(self):
+        url = reverse('journal', args=[self.writer.pk]) + '?tag=whales'
+        self.client.force_login(self.writer)
+        self.assertEqual(self.client.get(url).context['filters'].tags[0].slug, 'whales')
+        with self.assertNumQueries(0):
+            self.assertEqual(tagging.get_tag('whales').slug, 'whales')
+        tag = tagging.get_tag('whales')
+        tag.slug = 'whale'
+        tag.save()
+        self.assertIsNone(tagging.get_tag('whales'))
+
+    def test_rebuild_command(self):
+        models.TagUsage.objects.all().delete()
+        call_command('rebuild_tag_usage', stdout=StringIO())
+        self.assertEqual(self.cloud(Visibility.PUBLIC), {'whales': 2, 'sea': 1})
+
+
+class FacetTests(JournalTestCase):
+    journal_visibility = Visibility.PUBLIC
+
+    def setUp(self):
+        super().setUp()
+        self.typee = models.Book.objects.create(title='Typee')
+        self.entries = {}
+        for title, book, year, visibility, tags in (
+            ('whale', self.book, 2023, Visibility.PUBLIC, ['sea', 'whales']),
+            ('ship', self.book, 2023, Visibility.PUBLIC, ['sea', 'ships']),
+            ('ahab', self.book, 2022, Visibility.FOLLOWERS, ['sea', 'whales']),
+            ('island', self.typee, 2023, Visibility.PUBLIC, ['sea', 'whales']),
+        ):
+            entry = models.Entry.objects.create(
+                author=self.writer,
+                book=book,
+                title=title,
+                body=title,
+                visibility=visibility,
+                publish_dt=timezone.make_aware(datetime(year, 6, 1)),
+            )
+            entry.tags.add(*tags)
+            self.entries[title] = entry
+        self.client.force_login(self.writer)
+        self.url = reverse('journal', args=[self.writer.pk])
+
+    def titles(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(entry.title for entry in response.context['entries'])
+
+    def test_filters(self):
+        self.assertEqual(self.titles('tag=sea&tag=whales'), ['ahab', 'island', 'whale'])
+        self.assertEqual(self.titles(f'tag=sea&tag=whales&book={self.book.pk}'), ['ahab', 'whale'])
+        self.assertEqual(self.titles('tag=whales&since=2023-01-01&until=2023-12-31'), ['island', 'whale'])
+        self.assertEqual(self.titles('visibility=1'), ['ahab'])
+        # unknown tags and invalid values are ignored
+        self.assertEqual(self.titles('tag=whales&tag=squid&since=never'), ['ahab', 'island', 'whale'])
+
+    def test_facet_counts(self):
+        response = self.client.get(f'{self.url}?tag=whales&book={self.book.pk}&since=2023-01-01&until=2023-12-31')
+        facets = response.context['facets']
+        self.assertEqual([(tag['slug'], tag['count']) for tag in facets['tags']], [('sea', 1)])
+        self.assertEqual(
+            {tag['url'] for tag in facets['tags']},
+            {f'?tag=whales&tag=sea&book={self.book.pk}&since=2023-01-01&until=2023-12-31'},
+        )
+        # books and years are counted without their own filter
+        self.assertEqual([(book['title'], book['count']) for book in facets['books']], [('Moby Dick', 1), ('Typee', 1)])
+        self.assertEqual([(year['year'], year['count']) for year in facets['years']], [(2023, 1), (2022, 1)])
+        self.assertContains(response, 'tag=whales&amp;tag=sea')
+        self.assertContains(response, '>Typee</a> (1)')
+        self.assertEqual(facets['capped'], {'tags': False, 'books': False, 'years': False})
+        self.assertNotContains(response, 'counts from the newest')
+
+    @mock.patch.object(facets, 'FACET_SCAN', 2)
+    def test_capped_facets(self):
+        # four entries are tagged sea, the facets only count the newest two
+        response = self.client.get(f'{self.url}?tag=sea&book={self.typee.pk}')
+        capped = response.context['facets']['capped']
+        self.assertEqual(capped, {'tags': False, 'books': True, 'years': False})
+        self.assertContains(response, 'Book counts from the newest 2 entries')
+        response = self.client.get(f'{self.url}?tag=sea')
+        self.assertEqual(sum(tag['count'] for tag in response.context['facets']['tags']), 2)
+        self.assertContains(response, 'Tag counts from the newest 2 entries')
+        self.assertContains(response, 'Year counts from the newest 2 entries')
+
+    def test_unfiltered_lists_have_no_facets(self):
+        self.assertIsNone(self.client.get(self.url).context['facets'])
+
+    def test_constant_queries(self):
+        url = f'{self.url}?tag=sea'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(10):
+            book = models.Book.objects.create(title=f'Book {i}')
+            entry = models.Entry.objects.create(
+                author=self.writer,
+                book=book,
+                body='entry',
+                publish_dt=timezone.make_aware(datetime(2000 + i, 1, 1)),
+            )
+            entry.tags.add('sea', f'tag-{i}')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['facets']['years']), 12)
+        self.assertEqual(len(small), len(large))
+
+    def test_discover(self):
+        self.client.logout()
+        response = self.client.get(reverse('discover') + '?tag=sea&tag=whales')
+        self.assertEqual(sorted(entry.title for entry in response.context['entries']), ['island', 'whale'])
+        self.assertEqual([(y['year'], y['count']) for y in response.context['facets']['years']], [(2023, 2)])
+        response = self.client.get(reverse('discover_book', args=[self.book.pk]) + '?tag=sea')
+        self.assertEqual(response.context['facets']['books'], [])
+
+
+class BoundedCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'pw')
+        models.Profile.objects.create(user=cls.user)
+        for i in range(5):
+            models.Book.objects.create(title=f'Moby Dick {i}')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_search_count_is_capped(self):
+        with mock.patch.object(views.BookListView, 'count_cap', 2):
+            response = self.client.get(reverse('book_list'), {'query': 'moby'})
+        self.assertContains(response, '2+ books matching')
+        self.assertFalse(response.context['page_obj'].paginator.count_is_exact)
+
+    def test_search_count_under_cap_is_exact(self):
+        response = self.client.get(reverse('book_list'), {'query': 'moby'})
+        self.assertContains(response, '5 books matching')
+
+    @mock.patch.object(views.BookListView, 'paginate_by', 2)
+    @mock.patch.object(views.BookListView, 'count_cap', 2)
+    def test_capped_pages_look_ahead(self):
+        pages = [self.client.get(reverse('book_list'), {'page': n}) for n in (1, 3)]
+        self.assertTrue(pages[0].context['page_obj'].has_next())
+        self.assertEqual(len(pages[1].context['books']), 1)
+        self.assertFalse(pages[1].context['page_obj'].has_next())
+
+
+class LibrarySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'pw')
+        cls.tolkien = models.Author.objects.create(
+            first_name='John',
+            middle_name='Ronald Reuel',
+            last_name='Tolkien',
+            aka='J. R. R. Tolkien',
+        )
+        cls.hobbit = models.Book.objects.create(title='The Hobbit')
+        cls.hobbit.authors.add(cls.tolkien)
+        models.Book.objects.create(title='Moby Dick')
+
+    def autocomplete(self, name, term):
+        response = self.client.get(reverse(name), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return [r['id'] for r in response.json()['results']]
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.autocomplete('author_autocomplete', 'tolk ron'), [self.tolkien.pk])
+        self.assertEqual(self.autocomplete('author_autocomplete', 'tolkein'), [])
+        self.assertEqual(self.autocomplete('book_autocomplete', 'hob'), [self.hobbit.pk])
+        # books are also found by their authors' names
+        self.assertEqual(self.autocomplete('book_autocomplete', 'j. r. r.'), [self.hobbit.pk])
+        self.assertEqual(self.autocomplete('book_autocomplete', '!!'), [])
+
+    @mock.patch('journal.models.journal.EntryQuerySet.update_search_vector')
+    def test_title_changes_refresh_entry_vectors(self, update_search_vector):
+        book = models.Book.objects.only('description').get(pk=self.hobbit.pk)
+        # a deferred title is neither loaded nor taken for a change
+        with self.assertNumQueries(1):
+            book.save()
+        update_search_vector.assert_not_called()
+        book.title = 'There and Back Again'
+        book.save()
+        update_search_vector.assert_called_once()
+
+        book = models.Book.objects.get(pk=self.hobbit.pk)
+        book.save()
+        update_search_vector.assert_called_once()
+
+    def test_book_form_only_renders_selected_authors(self):
+        models.Author.objects.create(last_name='Melville')
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('book_create'), {'title': '', 'authors': [self.tolkien.pk]})
+        self.assertContains(response, f'<option value="{self.tolkien.pk}" selected>')
+        self.assertNotContains(response, 'Melville')
+        self.assertContains(response, 'data-autocomplete-url="/authors/autocomplete/"')
+
+
+class JournalImportTests(TestCase):
+    csv = (
+        'book,authors,title,body,tags,visibility,publish_dt\n'
+        'The Hobbit,J. R. R. Tolkien,,In a hole *in the ground*,"fantasy, reread",followers,2024-01-02\n'
+        'the hobbit,j. r. r. tolkien,Riddles,Second entry,fantasy,public,2024-01-03T10:00:00Z\n'
+        'The Silmarillion,J. R. R. Tolkien; Christopher Tolkien,,,,,\n'
+        'Moby Dick,Herman Melville,,Call me Ishmael,,private,\n'
+    )
+
+    def setUp(self):
+        User = get_user_model()
+        self.writer = User.objects.create_user('writer', 'writer@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        for user in (self.reader, self.writer):
+            models.Profile.objects.create(user=user, journal_visibility=Visibility.PUBLIC)
+        self.reader.following.add(self.writer)
+        models.Author.objects.create(first_name='Herman', last_name='Melville')
+        self.path = os.path.join(tempfile.mkdtemp(), 'journal.csv')
+        with open(self.path, 'w') as f:
+            f.write(self.csv)
+
+    def import_journal(self, *args):
+        call_command('import_journal', 'writer', self.path, *args, stdout=StringIO())
+
+    def test_import_csv(self):
+        self.import_journal('--batch-size', '2')
+        entries = models.Entry.objects.filter(author=self.writer).order_by('publish_dt')
+        self.assertEqual(entries.count(), 3)
+        # books and authors are deduplicated within the file and against existing rows
+        self.assertEqual(models.Book.objects.count(), 2)
+        self.assertEqual(models.Author.objects.count(), 2)
+        self.assertEqual(models.Entry.objects.get(search_vector='ground').body_html, '<p>In a hole <em>in the ground</em></p>')
+        self.assertEqual(
+            sorted(entries.filter(tags__name='fantasy').values_list('title', flat=True)),
+            ['', 'Riddles'],
+        )
+        self.assertEqual(models.Profile.objects.get(user=self.writer).entry_count, 3)
+        self.assertEqual(
+            set(models.TimelineEntry.objects.filter(user=self.reader).values_list('entry__body', flat=True)),
+            {'In a hole *in the ground*', 'Second entry'},
+        )
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_resume_from_checkpoint(self):
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            f.write('{"rows": 2}')
+        self.import_journal('--resume')
+        self.assertEqual(
+            list(models.Entry.objects.values_list('body', flat=True)),
+            ['Call me Ishmael'],
+        )
+
+    def test_upload_markdown(self):
+        self.client.force_login(self.writer)
+        upload = SimpleUploadedFile('journal.md', (
+            b'---\nbook: The Hobbit\nauthors: J. R. R. Tolkien\ntags: fantasy\n---\n'
+            b'First\n\n---\n\nstill first\n'
+            b'---\nbook: The Hobbit\n---\nSecond\n'
+        ))
+        response = self.client.post(reverse('journal_import'), {'file': upload})
+        self.assertRedirects(response, reverse('journal', args=[self.writer.pk]))
+        self.assertEqual(
+            list(models.Entry.objects.order_by('pk').values_list('body', flat=True)),
+            ['First\n\n---\n\nstill first', 'Second'],
+        )
+
+
+class JournalExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('writer', 'writer@example.com', 'pw')
+        models.Profile.objects.create(user=self.user)
+        book = models.Book.objects.create(title='The Hobbit', published=1937)
+        book.authors.add(models.Author.objects.create(first_name='John', last_name='Tolkien'))
+        for i in range(3):
+            entry = models.Entry.objects.create(
+                author=self.user,
+                book=book,
+                title=f'Chapter {i}',
+                body=f'entry *{i}*\n\n---\n\nmore',
+                visibility=Visibility.FOLLOWERS,
+            )
+            entry.tags.add('fantasy')
+
+    async def export(self, export_format):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('journal_export'), {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_json(self):
+        data = json.loads(await self.export('json'))
+        self.assertEqual([e['title'] for e in data], ['Chapter 0', 'Chapter 1', 'Chapter 2'])
+        self.assertEqual(data[0]['authors'], ['John Tolkien'])
+        self.assertEqual(data[0]['tags'], ['fantasy'])
+
+    def test_markdown_zip_imports_again(self):
+        export = async_to_sync(self.export)('markdown')
+        with zipfile.ZipFile(io.BytesIO(export)) as archive:
+            files = [archive.read(name).decode() for name in archive.namelist()]
+        self.assertEqual(len(files), 3)
+        models.Entry.objects.all().delete()
+        importers.JournalImporter(self.user).run(importers.read_markdown(''.join(files).splitlines()))
+        entry = models.Entry.objects.get(title='Chapter 0')
+        self.assertEqual(entry.body, 'entry *0*\n\n---\n\nmore')
+        self.assertEqual(entry.visibility, Visibility.FOLLOWERS)
+        self.assertEqual(list(entry.tags.names()), ['fantasy'])
+        self.assertEqual(models.Book.objects.count(), 1)
+
+
+class SitemapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.public = User.objects.create_user('public', 'public@example.com', 'pw')
+        models.Profile.objects.create(user=self.public, journal_visibility=Visibility.PUBLIC)
+        self.private = User.objects.create_user('private', 'private@example.com', 'pw')
+        models.Profile.objects.create(user=self.private)
+        book = models.Book.objects.create(title='Emma')
+        self.entry = models.Entry.objects.create(
+            author=self.public, book=book, body='public', visibility=Visibility.PUBLIC,
+        )
+        models.Entry.objects.create(author=self.public, book=book, body='followers', visibility=Visibility.FOLLOWERS)
+        models.Entry.objects.create(author=self.private, book=book, body='private', visibility=Visibility.PUBLIC)
+
+    def test_index_lists_sections(self):
+        content = self.client.get('/sitemap.xml').content.decode()
+        for section in ('authors', 'books', 'journals', 'entries'):
+            self.assertIn(f'/sitemap-{section}.xml</loc>', content)
+
+    def test_only_public_entries_and_journals(self):
+        content = self.client.get('/sitemap-entries.xml').content.decode()
+        self.assertEqual(content.count('<url>'), 1)
+        self.assertIn(f'{self.entry.get_absolute_url()}</loc><lastmod>{self.entry.updated:%Y-%m-%d}', content)
+        content = self.client.get('/sitemap-journals.xml').content.decode()
+        self.assertEqual(content.count('<url>'), 1)
+        self.assertIn(reverse('journal', args=[self.public.pk]), content)
+
+    def test_cached_until_content_changes(self):
+        self.client.get('/sitemap-entries.xml')
+        with self.assertNumQueries(0):
+            self.client.get('/sitemap-entries.xml')
+        models.Entry.objects.filter(author=self.public).update(visibility=Visibility.PUBLIC)
+        for entry in models.Entry.objects.filter(author=self.public):
+            entry.save()
+        content = self.client.get('/sitemap-entries.xml').content.decode()
+        self.assertEqual(content.count('<url>'), 2)
+
+
+class EntryCardCacheTests(JournalTestCase):
+    journal_visibility = Visibility.PUBLIC
+
+    def setUp(self):
+        super().setUp()
+        self.entry = models.Entry.objects.create(
+            author=self.writer,
+            book=self.book,
+            body='first *draft*',
+            visibility=Visibility.PUBLIC,
+        )
+        self.url = reverse('journal', args=[self.writer.pk])
+
+    def test_viewer_dependent_links(self):
+        edit_url = reverse('entry_update', args=[self.writer.pk, self.entry.pk])
+        self.client.force_login(self.writer)
+        self.assertContains(self.client.get(self.url), edit_url)
+        self.client.force_login(self.reader)
+        self.assertNotContains(self.client.get(self.url), edit_url)
+
+    def test_served_from_cache_until_changed(self):
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(self.url), '<em>draft</em>')
+        with mock.patch('journal.models.Entry.get_preview_html') as get_preview_html:
+            self.assertContains(self.client.get(self.url), '<em>draft</em>')
+        get_preview_html.assert_not_called()
+
+        self.entry.tags.add('regency')
+        self.assertContains(self.client.get(self.url), '# regency')
+        self.entry.body = 'final'
+        self.entry.save()
+        self.assertNotContains(self.client.get(self.url), '<em>draft</em>')
+
+    def test_renamed_authors(self):
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(self.url), '<span class="entry-author">writer</span>')
+        self.writer.username = 'novelist'
+        self.writer.save()
+        self.assertContains(self.client.get(self.url), '<span class="entry-author">novelist</span>')
+        # logins don't drop the cards
+        with mock.patch('journal.templatetags.entry_tags.invalidate_author') as invalidate_author:
+            self.client.force_login(self.writer)
+        invalidate_author.assert_not_called()
+
+
+class PreviewTests(JournalTestCase):
+    journal_visibility = Visibility.PUBLIC
+
+    def setUp(self):
+        super().setUp()
+        self.long = models.Entry.objects.create(
+            author=self.writer,
+            book=self.book,
+            body='*Emma* Woodhouse, ' + 'handsome, clever, and rich, ' * 30 + 'the end',
+            visibility=Visibility.PUBLIC,
+        )
+        self.short = models.Entry.objects.create(
+            author=self.writer,
+            book=self.book,
+            body='a short *note*',
+            visibility=Visibility.PUBLIC,
+        )
+        self.url = reverse('journal', args=[self.writer.pk])
+
+    def test_lists_show_previews(self):
+        self.assertTrue(self.long.preview_truncated)
+        self.assertFalse(self.short.preview_truncated)
+        self.assertEqual(self.short.preview_html, self.short.body_html)
+        detail_url = reverse('entry_detail', args=[self.writer.pk, self.long.pk])
+        for url in (self.url, reverse('discover')):
+            response = self.client.get(url)
+            self.assertContains(response, '<em>Emma</em> Woodhouse')
+            self.assertContains(response, 'a short <em>note</em>')
+            self.assertNotContains(response, 'the end')
+            self.assertContains(response, 'Read more', count=1)
+            self.assertContains(response, f'href="{detail_url}" class="read-more"')
+        self.assertContains(self.client.get(detail_url), 'the end')
+
+    def test_lists_do_not_load_bodies(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        entry_queries = [q['sql'] for q in queries if 'FROM "journal_entry"' in q['sql']]
+        self.assertTrue(entry_queries)
+        for sql in entry_queries:
+            self.assertNotIn('"journal_entry"."body"', sql)
+            self.assertNotIn('"journal_entry"."body_html"', sql)
+
+    def test_stale_previews(self):
+        models.Entry.objects.filter(pk=self.long.pk).update(preview_html='<p>stale</p>', markdown_version=0)
+        # the stored preview is shown without loading the body
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(self.url), 'stale')
+        self.assertFalse([q for q in queries if '"journal_entry"."body"' in q['sql']])
+        call_command('render_markdown', stdout=StringIO())
+        self.long.refresh_from_db()
+        self.assertIn('<em>Emma</em> Woodhouse', self.long.preview_html)
+
+
+class ConditionalGetTests(JournalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader.following.add(self.writer)
+        self.entry = models.Entry.objects.create(
+            author=self.writer,
+            book=self.book,
+            body='body',
+            visibility=Visibility.FOLLOWERS,
+        )
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return lambda: self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag']).status_code
+
+    def test_journal(self):
+        status = self.revalidate(reverse('journal', args=[self.writer.pk]))
+        # session and journal profile, then the entry validators instead of the list;
+        # the user and its follow request count come from the cache
+        with self.assertNumQueries(3):
+            self.assertEqual(status(), 304)
+        self.entry.save()
+        self.assertEqual(status(), 200)
+
+    def test_journal_entry_deleted(self):
+        older = models.Entry.objects.create(
+            author=self.writer,
+            book=self.entry.book,
+            body='older',
+            visibility=Visibility.FOLLOWERS,
+        )
+        self.entry.save()
+        status = self.revalidate(reverse('journal', args=[self.writer.pk]))
+        self.assertEqual(status(), 304)
+        older.delete()
+        self.assertEqual(status(), 200)
+
+    def test_entry_detail(self):
+        status = self.revalidate(reverse('entry_detail', args=[self.writer.pk, self.entry.pk]))
+        self.assertEqual(status(), 304)
+        self.entry.book.authors.add(models.Author.objects.create(last_name='Austen'))
+        self.assertEqual(status(), 200)
+
+    def test_viewer_state_is_part_of_the_etag(self):
+        status = self.revalidate(reverse('book_detail', args=[self.entry.book_id]))
+        self.assertEqual(status(), 304)
+        self.writer.following.add(self.reader)
+        models.FollowRequest.objects.create(user_from=self.writer, user_to=self.reader)
+        models.Profile.objects.filter(pk=self.reader.pk).refresh_counters()
+        self.assertEqual(status(), 200)
+
+
+class AnonymousPageCacheTests(JournalTestCase):
+    journal_visibility = Visibility.PUBLIC
+
+    def setUp(self):
+        super().setUp()
+        self.entry = models.Entry.objects.create(
+            author=self.writer, book=self.book, body='first', visibility=Visibility.PUBLIC,
+        )
+
+    def test_served_without_queries_until_purged(self):
+        url = reverse('discover')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'first')
+        models.Entry.objects.create(author=self.writer, book=self.book, body='second', visibility=Visibility.PUBLIC)
+        self.assertContains(self.client.get(url), 'second')
+
+    def test_purged_by_book_tag(self):
+        urls = [reverse('book_detail', args=[self.book.pk]), reverse('journal', args=[self.writer.pk])]
+        for url in urls:
+            self.client.get(url)
+        self.book.title = 'Persuasion'
+        self.book.save()
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Persuasion')
+
+    def test_sessions_bypass_the_cache(self):
+        url = reverse('book_detail', args=[self.book.pk])
+        self.client.force_login(self.writer)
+        self.assertContains(self.client.get(url), 'New Entry')
+        self.client.logout()
+        self.assertNotContains(self.client.get(url), 'New Entry')
+        self.client.force_login(self.writer)
+        self.assertContains(self.client.get(url), 'New Entry')
+
+
+class QueryPlanTests(TestCase):
+    """the hot queries are served by indexes, not sequential scans, once tables have realistic sizes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(2000)
+        )
+        models.Profile.objects.bulk_create(
+            models.Profile(user=user, journal_visibility=Visibility.PUBLIC if i % 2 else Visibility.FOLLOWERS)
+            for i, user in enumerate(users)
+        )
+        authors = models.Author.objects.bulk_create(
+            models.Author(first_name=f'First {i}', last_name=f'Last {i % 700}') for i in range(2000)
+        )
+        books = models.Book.objects.bulk_create(models.Book(title=f'Book {i}') for i in range(5000))
+        models.Book.authors.through.objects.bulk_create(
+            models.Book.authors.through(book=book, author=authors[i % len(authors)])
+            for i, book in enumerate(books)
+        )
+        now = timezone.now()
+        models.Entry.objects.bulk_create(
+            models.Entry(
+                author=users[i % 200],
+                book=books[i % len(books)],
+                body=f'entry {i}',
+                visibility=i % 3,
+                effective_visibility=min(i % 3, Visibility.PUBLIC if i % 200 % 2 else Visibility.FOLLOWERS),
+                status=models.Entry.Status.DRAFT if i % 10 == 0 else models.Entry.Status.PUBLISHED,
+                publish_dt=now - timedelta(minutes=i),
+            )
+            for i in range(20000)
+        )
+        models.Follower.objects.bulk_create(
+            models.Follower(user_from=users[i], user_to=users[(i + k) % 200])
+            for i in range(200) for k in range(1, 11)
+        )
+        models.FollowRequest.objects.bulk_create(
+            models.FollowRequest(user_from=users[i], user_to=users[(i + k) % len(users)])
+            for i in range(len(users)) for k in range(20, 25)
+        )
+        for k in range(1, 11):
+            models.TimelineEntry.objects.backfill(users[0].pk, users[k].pk)
+        cls.owner, cls.visitor = users[0], users[1]
+        cls.book = books[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+
+    def plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertIndexed(self, url, *tables, user=None):
+        """no query `url` makes on `tables` scans them sequentially"""
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for table in tables:
+            statements = [q['sql'] for q in queries if f'"{table}"' in q['sql'] and q['sql'].startswith('SELECT')]
+            self.assertTrue(statements, f'{url} does not query {table}')
+            for sql in statements:
+                plan = self.plan(sql)
+                self.assertNotIn(f'Seq Scan on {table}', plan, f'{sql}\n{plan}')
+
+    def test_journals(self):
+        self.assertIndexed(reverse('journal', args=[self.owner.pk]), 'journal_entry', user=self.owner)
+        # a followed journal
+        self.assertIndexed(reverse('journal', args=[self.visitor.pk]), 'journal_entry', user=self.owner)
+        self.assertIndexed(reverse('journal_book', args=[self.owner.pk, self.book.pk]), 'journal_entry', user=self.owner)
+
+    def test_discover(self):
+        self.assertIndexed(reverse('discover'), 'journal_entry', user=self.visitor)
+        self.assertIndexed(reverse('discover_book', args=[self.book.pk]), 'journal_entry', user=self.visitor)
+
+    def test_faceted(self):
+        since = (timezone.now() - timedelta(days=3)).date().isoformat()
+        self.assertIndexed(
+            reverse('journal', args=[self.owner.pk]) + f'?since={since}&visibility=2', 'journal_entry', user=self.owner,
+        )
+        self.assertIndexed(reverse('discover') + f'?since={since}', 'journal_entry', user=self.visitor)
+
+    def test_following(self):
+        self.assertIndexed(reverse('following_feed'), 'journal_timelineentry', user=self.owner)
+        self.assertIndexed(reverse('follow_requests'), 'journal_followrequest', user=self.owner)
+        self.assertIndexed(
+            reverse('user_detail', args=[self.visitor.pk]), 'journal_follower', 'journal_followrequest', user=self.owner,
+        )
+
+    def test_library(self):
+        self.assertIndexed(reverse('book_list'), 'journal_book', user=self.owner)
+        self.assertIndexed(reverse('author_list'), 'journal_author', user=self.owner)
+
+    def test_login_by_email(self):
+        queryset = get_user_model().objects.filter(email__iexact='User7@Example.com')
+        self.assertNotIn('Seq Scan on auth_user', self.plan(*queryset.query.sql_with_params()))
+
+
+class ViewBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = benchmarks.seed(40)[1]
+
+    def test_every_url_is_benchmarked(self):
+        self.assertEqual(benchmarks.url_names(), benchmarks.VIEWS.keys() | benchmarks.SKIPPED)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'journal-shared-cache'),
+    }})
+    def test_shared_caches_are_not_emptied(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_views', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('profile_url', '/', '--cold', stdout=StringIO(), stderr=StringIO())
+        with self.assertRaises(ValueError):
+            benchmarks.measure(self.client, '/', 1)
+
+    def test_query_budgets(self):
+        fixtures = benchmarks.Fixtures(self.user)
+        self.client.force_login(self.user)
+        for name, (kwargs, query_string, max_queries, _) in benchmarks.VIEWS.items():
+            with self.subTest(name):
+                result = benchmarks.measure(self.client, f'{reverse(name, kwargs=kwargs(fixtures))}?{query_string}', 1)
+                self.assertLess(result['status'], 400)
+                if max_queries is not None:
+                    self.assertLessEqual(result['queries'], max_queries)
+
+
+class ServerTimingTests(JournalTestCase):
+    def test_header_and_log_line(self):
+        with self.assertLogs('journal.requests', 'INFO') as logs:
+            response = self.client.get(reverse('book_detail', args=[self.book.pk]))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[\d.]+, count;desc=\d+, render;dur=[\d.]+')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'book_detail')
+        self.assertEqual(line['queries'], int(re.search(r'count;desc=(\d+)', header)[1]))
+
+    def test_markdown_phase(self):
+        timings, token = timing.start()
+        try:
+            render_markdown('*Emma*')
+        finally:
+            timing.stop(token)
+        self.assertGreater(timings.seconds['markdown'], 0)
+        self.assertEqual(render_markdown('*Emma*'), '<p><em>Emma</em></p>')
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def test_sampler_keeps_the_stacks_of_the_request(self):
+        other = threading.Thread(target=spin, args=(0.2,))
+        other.start()
+        with profiling.Sampler(sys._getframe()) as sampler:
+            spin(0.1)
+        other.join()
+        self.assertIn(spin.__code__, sampler.samples.most_common(1)[0][0])
+        for stack in sampler.samples:
+            self.assertNotIn(threading.Thread.run.__code__, stack)
+        self.assertIn('spin (journal/tests.py:', sampler.collapsed())
+        self.assertEqual(sampler.breakdown()['other'], 1)
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_staff_only(self):
+        url = reverse('book_list') + '?profile=1'
+        self.assertContains(self.client.get(url), 'Books')
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertRegex(response.content.decode(), r'^GET /books/\?profile=1 200: \d+ samples.*\n\nmarkdown')
+
+    def test_disabled_outside_debug(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertContains(self.client.get(reverse('book_list') + '?profile=1'), 'Books')
@@ -0,0 +1,85 @@
+"""
+Per-request timing of SQL, template rendering, markdown and context processors.
+
+journal.middleware.ServerTimingMiddleware starts a Timings for every request
+in a context variable, which follows the request into the threads
+sync_to_async runs ORM and rendering code in. Every database connection gets
+`record_query` as a permanent execute wrapper (see journal.signals) and the
+other phases are timed with `phase`. Outside of a request both cost a context
+variable lookup.
+
+Phases nest: render includes the queries, markdown and context processors run
+while the templates render.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PHASES = ('db', 'render', 'markdown', 'context')
+
+_current = ContextVar('journal_timings', default=None)
+
+
+class Timings(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+
+    def ms(self):
+        """the milliseconds of every phase and of the whole request so far"""
+        return {
+            **{phase: seconds * 1000 for phase, seconds in self.seconds.items()},
+            'total': (time.perf_counter() - self.started) * 1000,
+        }
+
+    def header(self):
+        """the value of a Server-Timing header"""
+        ms = self.ms()
+        metrics = [f'db;dur={ms["db"]:.1f}', f'count;desc={self.queries}']
+        metrics += [f'{phase};dur={ms[phase]:.1f}' for phase in PHASES[1:] if self.seconds[phase]]
+        metrics.append(f'total;dur={ms["total"]:.1f}')
+        return ', '.join(metrics)
+
+
+def start():
+    """time the current request, returns its Timings and the token for `stop`"""
+    timings = Timings()
+    return timings, _current.set(timings)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """an execute wrapper adding each query to the timings of the current request"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add('db', time.perf_counter() - started)
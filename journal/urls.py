@@ -4,6 +4,8 @@ from . import views
 
 urlpatterns = [
     path('', views.journal_redirect, name='user_journal'),
+    path('import/', views.JournalImportView.as_view(), name='journal_import'),
+    path('export/', views.JournalExportView.as_view(), name='journal_export'),
     path(
         '<int:user_pk>/',
         include([
@@ -1,22 +1,36 @@
-from django.db.models import Q
+import io
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.views import generic
 from django.contrib import messages
 from django.forms import modelform_factory
 from django.core.validators import slug_re
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth import get_user_model
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.http import http_date, quote_etag
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.decorators.http import require_POST
-from django.contrib.postgres.search import SearchVector
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.views.generic.base import TemplateResponseMixin, ContextMixin, View
 
-from taggit.models import Tag
-
+from journal import authentication
+from journal import exporters
+from journal import facets
+from journal import feeds
 from journal import forms
+from journal import importers
 from journal import models
+from journal import pagecache
+from journal import pagination
+from journal import relationships
+from journal import rendering
+from journal import tagging
 
 
 def index(request):
@@ -72,7 +86,7 @@ class EmailUpdateView(
     LoginRequiredMixin,
     generic.UpdateView,
 ):
-    fields = ('email',)
+    form_class = forms.EmailUpdateForm
     template_name = 'manage/email_update.html'
     success_url = '/account/'
 
@@ -124,11 +138,9 @@ class OtherProfileMixin(object):
     request_from = False
     request_to = False
 
-    def check_and_set_other_profile(self, pk):
-        self.profile = get_object_or_404(
-            models.Profile,
-            pk=pk,
-        )
+    async def acheck_and_set_other_profile(self, pk):
+        self.profile = await aget_object_or_404(models.Profile.objects.select_related('user'), pk=pk)
+        relationship = await relationships.aget_relationship(self.request, pk)
         journal_visibility = self.profile.journal_visibility
         public_user = journal_visibility == models.journal.Visibility.PUBLIC
         if (
@@ -146,40 +158,45 @@ class OtherProfileMixin(object):
         self.request_to = False
         if self.request_user.is_authenticated:
             # save to assume the journal author has at least visibility >= followers
-            followed_user = self.request_user.following.all().filter(pk__contains=self.profile.pk).exists()
+            followed_user = relationship.follower is not None
 
             if followed_user:
-                self.follower = models.Follower.objects.get(
-                    user_from=self.request_user,
-                    user_to=self.profile.user,
-                )
+                self.follower = relationship.follower
             else:
-                # assumes there can only be one follow request from/to
-                self.request_from = models.FollowRequest.objects.filter(
-                    user_from=self.profile.user,
-                    user_to=self.request_user,
-                ).first()
-                self.request_to = models.FollowRequest.objects.filter(
-                    user_from=self.request_user,
-                    user_to=self.profile.user,
-                ).first()
+                self.request_from = relationship.request_from
+                self.request_to = relationship.request_to
 
         if not (public_user or followed_user or self_user):
             self.raise_404(self.profile.user)
 
+    def relationship_validators(self):
+        return [
+            (obj.pk, getattr(obj, 'status', None)) if obj else None
+            for obj in (self.follower, self.request_from, self.request_to)
+        ]
+
+    async def ais_visible_to_request_user(self, entry):
+        """python equivalent of visible_to_request_user_Q for a single entry"""
+        if self.request.user.is_authenticated and entry.author_id == self.request.user.pk:
+            return True
+        if entry.status != models.Entry.Status.PUBLISHED:
+            return False
+        if entry.effective_visibility == models.journal.Visibility.PUBLIC:
+            return True
+        return (
+            entry.effective_visibility >= models.journal.Visibility.FOLLOWERS
+            and (await relationships.aget_relationship(self.request, entry.author_id)).follower is not None
+        )
+
     def visible_to_request_user_Q(self):
         """all entries that are visible to self.request.user"""
         published_q = Q(status=models.Entry.Status.PUBLISHED)
-        public_q = (
-                Q(author__profile__journal_visibility=models.journal.Visibility.PUBLIC)
-                & Q(visibility=models.journal.Visibility.PUBLIC)
-        )
+        public_q = Q(effective_visibility=models.journal.Visibility.PUBLIC)
         follower_q = Q()
         self_q = Q()
         if self.request.user.is_authenticated:
             follower_q = (
-                    Q(author__profile__journal_visibility__gte=models.journal.Visibility.FOLLOWERS)
-                    & Q(visibility__gte=models.journal.Visibility.FOLLOWERS)
+                    Q(effective_visibility__gte=models.journal.Visibility.FOLLOWERS)
                     & Q(author__in=self.request.user.following.all())
             )
             self_q = Q(author=self.request.user)
@@ -207,13 +224,7 @@ class SearchMixin(object):
     def get_queryset(self):
         qs = super().get_queryset()
         if self.query:
-            qs = qs.annotate(
-                search=SearchVector(
-                    'title',
-                    'body',
-                    'book__title',
-                ),
-            ).filter(search=self.query)
+            qs = qs.filter(search_vector=self.query)
         return qs
 
     def get_context_data(self, **kwargs):
@@ -225,49 +236,282 @@ class SearchMixin(object):
         return context
 
 
-class TagMixin(object):
-    tag = None
+class FacetMixin(object):
+    """
+    Filter entry lists by tags, book, publish dates and visibility, see
+    journal.facets. Facet counts are only loaded for filtered or searched lists.
+    """
+    # false where the url already picks the book
+    book_facet = True
+    filters = None
+    facet_counts = None
+    facet_form = forms.FacetForm()
     query_params = dict()
+    filters_without = ()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.query_params = {}
 
     def dispatch(self, request, *args, **kwargs):
-        self.tag = None
-        tag_slug = request.GET.get('tag')
-        if tag_slug:
-            if slug_re.match(tag_slug):
-                try:
-                    self.tag = Tag.objects.get(slug=tag_slug)
-                    self.query_params['tag'] = self.tag.slug
-                except Tag.DoesNotExist:
-                    pass
+        self.facet_counts = None
+        self.facet_form = forms.FacetForm(request.GET)
+        # invalid fields are left out of cleaned_data
+        self.facet_form.is_valid()
+        data = self.facet_form.cleaned_data
+        self.filters = facets.Filters(
+            tag_slugs=[slug for slug in request.GET.getlist('tag') if slug_re.match(slug)],
+            book_id=data.get('book') if self.book_facet else None,
+            since=data.get('since'),
+            until=data.get('until'),
+            visibility=data.get('visibility'),
+        )
         return super().dispatch(request, *args, **kwargs)
 
+    async def aprepare(self):
+        await super().aprepare()
+        await self.filters.aload()
+        self.query_params.update(self.filters.query_params())
+
     def get_queryset(self):
         qs = super().get_queryset()
-        if self.tag:
-            qs = qs.filter(tags__in=[self.tag])
-        return qs
+        return self.filters.apply(qs, without=self.filters_without)
+
+    def get_facet_queryset(self, *without):
+        """the queryset without the filters in `without`"""
+        self.filters_without = without
+        try:
+            return self.get_queryset()
+        finally:
+            self.filters_without = ()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if not self.query_params:
+            return await super().apaginate_queryset(queryset, page_size)
+        paginated = await super().apaginate_queryset(queryset, page_size)
+        self.facet_counts = await facets.acount(
+            self.get_facet_queryset,
+            self.query_params,
+            self.filters,
+            with_books=self.book_facet,
+        )
+        return paginated
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
-            'tag': self.tag,
+            'filters': self.filters,
+            'active_filters': self.filters.active(self.query_params),
+            'facets': self.facet_counts,
+            'facet_form': self.facet_form,
             'query_params': self.query_params,
         })
         return context
 
 
+class AsyncReadMixin(object):
+    """
+    Native async GET for read-only views under ASGI.
+
+    Everything the view needs before it can build its queryset is loaded in
+    `aprepare` with the async ORM, so no sync query runs on the event loop.
+    The async ORM runs its queries one after another in the request's thread,
+    so lookups are awaited in turn rather than gathered. Templates are rendered
+    by Django in a worker thread afterwards.
+    """
+    async def aprepare(self):
+        pass
+
+    async def async_setup(self, request):
+        request.user = await request.auser()
+        await self.aprepare()
+
+    async def anot_modified(self):
+        """a response that ends the request before the page is built, see ConditionalGetMixin"""
+        return None
+
+
+class AsyncListMixin(AsyncReadMixin):
+    """async ListView.get, the page is fetched by `apaginate_queryset`"""
+    paginated = None
+
+    async def get(self, request, *args, **kwargs):
+        await self.async_setup(request)
+        if response := await self.anot_modified():
+            return response
+        self.object_list = self.get_queryset()
+        page_size = self.get_paginate_by(self.object_list)
+        if page_size:
+            self.paginated = await self.apaginate_queryset(self.object_list, page_size)
+        return self.render_to_response(self.get_context_data())
+
+
+class AsyncDetailMixin(AsyncReadMixin):
+    """async DetailView.get, objects are looked up by pk"""
+    async def get(self, request, *args, **kwargs):
+        await self.async_setup(request)
+        self.object = await self.aget_object()
+        if response := await self.anot_modified():
+            return response
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    async def aget_object(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+        try:
+            return await queryset.aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                'No %(verbose_name)s found matching the query'
+                % {'verbose_name': queryset.model._meta.verbose_name}
+            )
+
+
+class ConditionalGetMixin(object):
+    """
+    ETag and Last-Modified validators for async read views, so a client with
+    a current copy gets a 304 before the list query runs or the template is
+    rendered.
+
+    `aget_validators` returns the values the page is built from and its last
+    modification time. It runs after `aprepare` (and after the object lookup
+    of detail views), so it can reuse whatever those loaded. The ETag is weak
+    since every render masks the csrf token differently.
+    """
+    etag = None
+    last_modified = None
+
+    async def aget_validators(self):
+        """(parts, last modified), None parts skip the conditional GET"""
+        return None, None
+
+    async def aviewer_validators(self):
+        """what the navigation shows of the request user"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        # the cached profile is invalidated with every follow request
+        profile = await authentication.aget_profile(user)
+        return user.pk, profile and profile.follow_request_count
+
+    async def anot_modified(self):
+        parts, self.last_modified = await self.aget_validators()
+        if parts is None:
+            return None
+        parts = [await self.aviewer_validators(), self.request.get_full_path(), rendering.MARKDOWN_RENDERER_VERSION, *parts]
+        self.etag = 'W/' + quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+        response = get_conditional_response(
+            self.request,
+            etag=self.etag,
+            last_modified=self.last_modified and int(self.last_modified.timestamp()),
+        )
+        if response is not None:
+            self.set_validator_headers(response)
+        return response
+
+    def set_validator_headers(self, response):
+        response.headers['ETag'] = self.etag
+        if self.last_modified:
+            response.headers['Last-Modified'] = http_date(self.last_modified.timestamp())
+        # pages differ per viewer, browsers keep them but revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        if self.etag:
+            self.set_validator_headers(response)
+        return response
+
+
+class PageCacheMixin(object):
+    """
+    Let AnonymousPageCacheMiddleware keep the page for anonymous visitors,
+    tagged with `get_page_cache_tags` so that journal.signals can purge the
+    pages showing a changed book, author or user.
+    """
+    page_cache_tags = ()
+
+    def get_page_cache_tags(self, context):
+        return set(self.page_cache_tags)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        if not self.request.user.is_authenticated:
+            response.page_cache_tags = self.get_page_cache_tags(context)
+        return response
+
+
+class BoundedCountMixin(object):
+    """
+    Paginate without exact COUNT(*)s: counts stop at `count_cap`, and lists
+    without search or tag filters use the planner's row estimate.
+    """
+    paginator_class = pagination.BoundedCountPaginator
+    count_cap = pagination.COUNT_CAP
+
+    def count_is_filtered(self):
+        return bool(getattr(self, 'query_params', None))
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            count_cap=self.count_cap,
+            estimate=not self.count_is_filtered(),
+            **kwargs,
+        )
+
+
+class CursorPaginationMixin(BoundedCountMixin):
+    """paginate by (publish_dt, id) keyset cursors instead of page numbers"""
+    cursor_param = 'cursor'
+    cursor_fields = ('publish_dt', 'id')
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return pagination.CursorPaginator(
+            queryset,
+            page_size,
+            self.cursor_fields,
+            count_cap=self.count_cap,
+            estimate=not self.count_is_filtered(),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if getattr(self, 'paginated', None) is not None:
+            # already fetched by AsyncListMixin.get
+            return self.paginated
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except pagination.InvalidCursor:
+            raise Http404('Invalid page cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            page = await paginator.apage(self.request.GET.get(self.cursor_param))
+        except pagination.InvalidCursor:
+            raise Http404('Invalid page cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
 class Journal(
     OtherProfileMixin,
+    ConditionalGetMixin,
+    PageCacheMixin,
     SearchMixin,
-    TagMixin,
+    FacetMixin,
+    CursorPaginationMixin,
+    AsyncListMixin,
     generic.ListView,
 ):
     request_user = None
     profile = None
+    book = None
+    tag_cloud = None
     is_self_profile: bool
 
     model = models.Entry
@@ -275,15 +519,63 @@ class Journal(
     paginate_by = 50
     template_name = 'journal/list.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        self.request_user = request.user
-        user_pk = kwargs.get('user_pk')
+    async def aprepare(self):
+        await super().aprepare()
+        await self.aset_profile()
+
+    async def aset_profile(self):
+        self.request_user = self.request.user
+        user_pk = self.kwargs.get('user_pk')
         self.is_self_profile = user_pk == self.request_user.pk
         if self.is_self_profile:
-            self.profile = self.request_user.profile
+            self.profile = await authentication.aget_profile(self.request_user)
+            if self.profile is None:
+                raise Http404('No profile of %(user)s' % {'user': self.request_user})
         else:
-            self.check_and_set_other_profile(user_pk)
-        return super().dispatch(request, *args, **kwargs)
+            await self.acheck_and_set_other_profile(user_pk)
+
+    async def aget_validators(self):
+        # the last change of an entry the request user sees, facets count entries outside of the
+        # filtered list; the author's entry count is read alongside to notice deletions
+        entry_count = models.Profile.objects.filter(pk=OuterRef('author_id')).values('entry_count')
+        latest = await self.get_facet_queryset(*facets.FILTERS).annotate(
+            entry_count=Subquery(entry_count),
+        ).order_by('-updated').values('updated', 'entry_count').afirst() or {'updated': None, 'entry_count': 0}
+        parts = [
+            self.profile.about,
+            *self.relationship_validators(),
+            latest['updated'],
+            latest['entry_count'],
+        ]
+        return parts, latest['updated']
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if self.query_params:
+            # filtered lists show facets instead
+            return await super().apaginate_queryset(queryset, page_size)
+        # the cloud is only loaded for pages that are rendered, not for 304s
+        paginated = await super().apaginate_queryset(queryset, page_size)
+        self.tag_cloud = await tagging.atag_cloud(
+            self.profile.pk,
+            self.tag_cloud_visibility(),
+            self.book and self.book.pk,
+        )
+        return paginated
+
+    def tag_cloud_visibility(self):
+        """the least visibility of the entries the request user sees, the journal admits them already"""
+        if self.is_self_profile:
+            return models.journal.Visibility.PRIVATE
+        if self.follower:
+            return models.journal.Visibility.FOLLOWERS
+        return models.journal.Visibility.PUBLIC
+
+    def get_page_cache_tags(self, context):
+        return {
+            *super().get_page_cache_tags(context),
+            pagecache.user_tag(self.profile.pk),
+            *pagecache.entry_tags(context['entries']),
+        }
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -291,7 +583,7 @@ class Journal(
         if not self.is_self_profile:
             visible_Q = self.visible_to_request_user_Q()
             qs = qs.filter(visible_Q)
-        return qs
+        return qs.for_list()
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -301,6 +593,7 @@ class Journal(
             'follower': self.follower,
             'request_from': self.request_from,
             'request_to': self.request_to,
+            'tag_cloud': self.tag_cloud,
         })
         return context
 
@@ -311,68 +604,10 @@ class Journal(
         )
 
 
-class AsdfJournal(
-    LoginRequiredMixin,
-    UserEntryMixin,
-    generic.ListView,
-):
-    """ListView of all request.user's entries"""
-    context_object_name = 'entries'
-    paginate_by = 50
-    template_name = 'journal/list.html'
-    query_params = {}
-    tag = None
-    form = forms.SearchForm()
-    query = None
-    results = []
-
-    def dispatch(self, request, *args, **kwargs):
-        self.query_params = {}
-        # search management
-        if 'query' in request.GET:
-            # todo: problem if this includes tag GET data?
-            self.form = forms.SearchForm(request.GET)
-            if self.form.is_valid():
-                self.query = self.form.cleaned_data['query']
-                self.query_params['query'] = self.query
-
-        # tag management
-        tag_slug = request.GET.get('tag')
-        if tag_slug:
-            if slug_re.match(tag_slug):
-                try:
-                    self.tag = Tag.objects.get(slug=tag_slug)
-                    self.query_params['tag'] = self.tag.slug
-                except Tag.DoesNotExist:
-                    pass
-        return super().dispatch(request, *args, **kwargs)
-
-    def get_queryset(self):
-        qs = super().get_queryset()
-        if self.tag:
-            qs = qs.filter(tags__in=[self.tag])
-        if self.query:
-            qs = qs.annotate(
-                search=SearchVector(
-                    'title',
-                    'body',
-                    'book__title',
-                ),
-            ).filter(search=self.query)
-        return qs
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context.update({
-            'tag': self.tag,
-            'form': self.form,
-            'query_params': self.query_params,
-        })
-        return context
-
-
 class UserEntryDetail(
     OtherProfileMixin,
+    ConditionalGetMixin,
+    AsyncDetailMixin,
     generic.DetailView,
 ):
     model = models.Entry
@@ -380,12 +615,17 @@ class UserEntryDetail(
 
     def get_queryset(self):
         qs = super().get_queryset()
-        visible_Q = self.visible_to_request_user_Q()
-        qs = qs.filter(visible_Q)
-        if qs.exists():
-            return qs
-        else:
+        return qs.select_related('author', 'book')
+
+    async def aget_object(self, queryset=None):
+        entry = await super().aget_object(queryset)
+        if not await self.ais_visible_to_request_user(entry):
             raise Http404('Entry does not exist or is not visible to the requesting user')
+        return entry
+
+    async def aget_validators(self):
+        entry = self.object
+        return [entry.pk, entry.updated, entry.book.updated], entry.updated
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -464,21 +704,61 @@ class UserEntryDelete(
         return reverse_lazy('journal', args=[self.request.user.pk])
 
 
+class JournalImportView(
+    LoginRequiredMixin,
+    generic.FormView,
+):
+    form_class = forms.JournalImportForm
+    template_name = 'manage/import.html'
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        read = importers.READERS[form.cleaned_data['format'] or importers.guess_format(upload.name)]
+        importer = importers.JournalImporter(self.request.user)
+        try:
+            # all or nothing, a failed upload can simply be fixed and sent again
+            with transaction.atomic():
+                importer.run(read(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')))
+        except (importers.ImportFormatError, UnicodeDecodeError) as e:
+            form.add_error('file', f'Could not import the file: {e}')
+            return self.form_invalid(form)
+        messages.success(self.request, f'Imported {importer.created} entries.')
+        return redirect('journal', self.request.user.pk)
+
+
+class JournalExportView(
+    LoginRequiredMixin,
+    View,
+):
+    """stream the request user's whole journal as a download"""
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'json')
+        if export_format not in exporters.FORMATS:
+            raise Http404
+        export, content_type, extension = exporters.FORMATS[export_format]
+        response = StreamingHttpResponse(
+            exporters.aiter_chunks(export(request.user)),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="journal-{request.user.username}.{extension}"'
+        return response
+
+
 class JournalBook(Journal):
-    book = None
+    book_facet = False
     template_name = 'journal/book.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        self.book = get_object_or_404(
-            models.Book,
-            pk=kwargs.get('book_pk')
-        )
-        return super().dispatch(request, *args, **kwargs)
+    async def aprepare(self):
+        self.book = await aget_object_or_404(models.Book, pk=self.kwargs.get('book_pk'))
+        await super().aprepare()
 
     def get_queryset(self):
         qs = super().get_queryset()
         return qs.filter(book=self.book)
 
+    def get_page_cache_tags(self, context):
+        return super().get_page_cache_tags(context) | {pagecache.book_tag(self.book.pk)}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
@@ -493,10 +773,16 @@ class BookCreateView(
 ):
     model = models.Book
     template_name = 'manage/book_create.html'
-    fields = ('title', 'authors', 'published',)
+    form_class = forms.BookForm
 
 
-class BookListView(generic.ListView):
+class BookListView(
+    BoundedCountMixin,
+    PageCacheMixin,
+    generic.ListView,
+):
+    # books are listed with their authors' names
+    page_cache_tags = ('books', 'authors')
     context_object_name = 'books'
     paginate_by = 50
     template_name = 'library/book_list.html'
@@ -515,14 +801,9 @@ class BookListView(generic.ListView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        qs = models.Book.objects.all()
+        qs = models.Book.objects.prefetch_related('authors')
         if self.query:
-            qs = qs.annotate(
-                search=SearchVector(
-                    'title',
-                    # todo: how to search authors?
-                ),
-            ).filter(search=self.query)
+            qs = qs.search(self.query)
         return qs
 
     def get_context_data(self, **kwargs):
@@ -535,11 +816,31 @@ class BookListView(generic.ListView):
         return context
 
 
-class BookDetailView(generic.DetailView):
+class BookDetailView(
+    ConditionalGetMixin,
+    PageCacheMixin,
+    AsyncDetailMixin,
+    generic.DetailView,
+):
     model = models.Book
     context_object_name = 'book'
     template_name = 'library/book_detail.html'
 
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related('authors')
+
+    async def aget_validators(self):
+        book = self.object
+        updated = max([book.updated, *(author.updated for author in book.authors.all())])
+        return [book.pk, updated], updated
+
+    def get_page_cache_tags(self, context):
+        book = self.object
+        return {
+            pagecache.book_tag(book.pk),
+            *(pagecache.author_tag(author.pk) for author in book.authors.all()),
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
@@ -548,6 +849,26 @@ class BookDetailView(generic.DetailView):
         return context
 
 
+class AutocompleteView(View):
+    """top `limit` prefix matches for ?q= as JSON"""
+    model = None
+    limit = 10
+
+    def get(self, request, *args, **kwargs):
+        term = request.GET.get('q', '').strip()
+        results = []
+        if term:
+            results = [
+                {'id': obj.pk, 'text': str(obj)}
+                for obj in self.model.objects.search(term)[:self.limit]
+            ]
+        return JsonResponse({'results': results})
+
+
+class BookAutocompleteView(AutocompleteView):
+    model = models.Book
+
+
 class AuthorCreateView(
     LoginRequiredMixin,
     generic.CreateView,
@@ -562,7 +883,12 @@ class AuthorCreateView(
         return form
 
 
-class AuthorListView(generic.ListView):
+class AuthorListView(
+    BoundedCountMixin,
+    PageCacheMixin,
+    generic.ListView,
+):
+    page_cache_tags = ('authors',)
     context_object_name = 'authors'
     paginate_by = 50
     template_name = 'library/author_list.html'
@@ -581,16 +907,14 @@ class AuthorListView(generic.ListView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        qs = models.Author.objects.all()
+        # a subquery rather than a join and GROUP BY, so the page is read in index order
+        # and only its rows are counted
+        book_count = models.Book.authors.through.objects.filter(
+            author=OuterRef('pk'),
+        ).values('author').annotate(count=Count('pk')).values('count')
+        qs = models.Author.objects.annotate(book_count=Coalesce(Subquery(book_count), 0))
         if self.query:
-            qs = qs.annotate(
-                search=SearchVector(
-                    'first_name',
-                    'middle_name',
-                    'last_name',
-                    'aka',
-                ),
-            ).filter(search=self.query)
+            qs = qs.search(self.query)
         return qs
 
     def get_context_data(self, **kwargs):
@@ -603,18 +927,33 @@ class AuthorListView(generic.ListView):
         return context
 
 
-class AuthorDetailView(generic.ListView):
+class AuthorAutocompleteView(AutocompleteView):
+    model = models.Author
+
+
+class AuthorDetailView(
+    ConditionalGetMixin,
+    AsyncListMixin,
+    generic.ListView,
+):
     author = None
     context_object_name = 'books'
     # paginate_by = 3
     template_name = 'library/author_detail.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        self.author = get_object_or_404(
+    async def aprepare(self):
+        self.author = await aget_object_or_404(
             models.Author,
-            pk=kwargs.get('author_pk'),
+            pk=self.kwargs.get('author_pk'),
         )
-        return super().dispatch(request, *args, **kwargs)
+
+    async def aget_validators(self):
+        books = await self.get_queryset().order_by().aaggregate(
+            updated=Max('updated'),
+            count=Count('pk'),
+        )
+        updated = max(filter(None, [self.author.updated, books['updated']]))
+        return [self.author.pk, self.author.updated, books['updated'], books['count']], updated
 
     def get_queryset(self):
         return models.Book.objects.filter(authors__in=[self.author])
@@ -630,6 +969,7 @@ class AuthorDetailView(generic.ListView):
 
 class FollowingList(
     LoginRequiredMixin,
+    BoundedCountMixin,
     generic.ListView,
 ):
     context_object_name = 'following'
@@ -639,7 +979,29 @@ class FollowingList(
     def get_queryset(self):
         return self.request.user.following.all().filter(
             profile__journal_visibility__gte=models.journal.Visibility.FOLLOWERS,
-        )
+        ).order_by('username', 'pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'section': 'following',
+        })
+        return context
+
+
+class FollowingFeed(
+    LoginRequiredMixin,
+    CursorPaginationMixin,
+    generic.ListView,
+):
+    """entries of followed journals, read from the request user's fanned-out timeline"""
+    model = models.Entry
+    context_object_name = 'entries'
+    paginate_by = 50
+    template_name = 'following/feed.html'
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return feeds.FollowingFeedPaginator(self.request.user, page_size)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -651,6 +1013,7 @@ class FollowingList(
 
 class UserDetail(
     # LoginRequiredMixin,
+    AsyncDetailMixin,
     generic.DetailView,
 ):
     model = get_user_model()
@@ -660,8 +1023,12 @@ class UserDetail(
     request_to = None
     follower = None
 
-    def get_object(self, **kwargs):
-        obj = super().get_object(**kwargs)
+    def get_queryset(self):
+        return super().get_queryset().select_related('profile')
+
+    async def aget_object(self, queryset=None):
+        obj = await super().aget_object(queryset)
+        relationship = await relationships.aget_relationship(self.request, obj.pk)
         profile_visibility = obj.profile.journal_visibility
         public_user = profile_visibility == models.journal.Visibility.PUBLIC
 
@@ -672,25 +1039,15 @@ class UserDetail(
         if self.request.user.is_authenticated:
             followed_user = (
                 profile_visibility >= models.journal.Visibility.FOLLOWERS
-                and self.request.user.following.all().filter(pk__contains=obj.pk).exists()
+                and relationship.follower is not None
             )
             self_user = obj == self.request.user
 
             if followed_user:
-                self.follower = models.Follower.objects.get(
-                    user_from=self.request.user,
-                    user_to=obj,
-                )
+                self.follower = relationship.follower
             else:
-                # implicitly assumes there can only be one follow request from/to
-                self.request_from = models.FollowRequest.objects.filter(
-                    user_from=obj,
-                    user_to=self.request.user,
-                ).first()
-                self.request_to = models.FollowRequest.objects.filter(
-                    user_from=self.request.user,
-                    user_to=obj,
-                ).first()
+                self.request_from = relationship.request_from
+                self.request_to = relationship.request_to
 
         if not (public_user or followed_user or self_user):
             raise Http404(
@@ -807,8 +1164,11 @@ def follow_decline(request, request_pk):
 
 class Discover(
     OtherProfileMixin,
+    PageCacheMixin,
     SearchMixin,
-    TagMixin,
+    FacetMixin,
+    CursorPaginationMixin,
+    AsyncListMixin,
     generic.ListView,
 ):
     model = models.Entry
@@ -816,10 +1176,16 @@ class Discover(
     template_name = 'discover/list.html'
     paginate_by = 50
 
+    # any public entry may show up
+    page_cache_tags = ('entries',)
+
     def get_queryset(self):
         qs = super().get_queryset()
         visible_Q = self.visible_to_request_user_Q()
-        return qs.filter(visible_Q)
+        return qs.filter(visible_Q).for_list()
+
+    def get_page_cache_tags(self, context):
+        return super().get_page_cache_tags(context) | pagecache.entry_tags(context['entries'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -831,19 +1197,20 @@ class Discover(
 
 class DiscoverBook(Discover):
     book = None
+    book_facet = False
     template_name = 'discover/book.html'
 
-    def dispatch(self, request, *args, **kwargs):
-        self.book = get_object_or_404(
-            models.Book,
-            pk=kwargs.get('book_pk'),
-        )
-        return super().dispatch(request, *args, **kwargs)
+    async def aprepare(self):
+        self.book = await aget_object_or_404(models.Book, pk=self.kwargs.get('book_pk'))
+        await super().aprepare()
 
     def get_queryset(self):
         qs = super().get_queryset()
         return qs.filter(book=self.book)
 
+    def get_page_cache_tags(self, context):
+        return super().get_page_cache_tags(context) | {pagecache.book_tag(self.book.pk)}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({